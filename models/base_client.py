@@ -1,7 +1,41 @@
 import os
 import re
+import time
+from dataclasses import dataclass, field
+
+# Marcador usado para compilar o template sem o trecho variável de cada linha
+DYNAMIC_MARKER = "<<<DYNAMIC_CONTENT>>>"
+
+
+@dataclass
+class Completion:
+    """
+    Resultado de uma chamada a um backend: o texto gerado e os metadados
+    que vão para o CSV de saída (qual tentativa venceu, latência etc.).
+    """
+    text: str
+    backend: str = ""
+    model: str = ""
+    attempt: str = "primary"
+    status: str = "OK"
+    latency_s: float = 0.0
+    # tokens de entrada reportados pelo backend (None quando não reportado)
+    input_tokens: int | None = None
+    cached_input_tokens: int | None = None
+    uncached_input_tokens: int | None = None
+    output_tokens: int | None = None
+    # tempos reportados pelo próprio backend, em segundos (ex: backend_eval_s)
+    backend_timings: dict = field(default_factory=dict)
+    extra: dict = field(default_factory=dict)
+
 
 class BaseClient:
+    # nome do backend no registry (models/registry.py)
+    name = "base"
+    # limites por requisição, definidos por set_limits
+    deadlines = None
+    max_output_tokens = None
+
     def load_template(self, file_name):
         """
         Carrega o conteúdo de um arquivo de template.
@@ -62,4 +96,72 @@ class BaseClient:
         
         # Restaura as chaves literais nos valores após a substituição
         formatted = formatted.replace("TEMP_OPEN_BRACE_", "{").replace("_TEMP_CLOSE_BRACE", "}")
-        return formatted
\ No newline at end of file
+        return formatted
+
+    def static_prefix(self, template: str, field: str = "removed_chunk") -> list[dict]:
+        """
+        Compila o template com um marcador no lugar de `field` e retorna as
+        mensagens até o marcador: a parte do prompt idêntica em todas as linhas.
+        A última mensagem pode ser parcial (só o texto antes do marcador).
+        """
+        messages = self.generate_prompt(template, **{field: DYNAMIC_MARKER})
+        prefix = []
+        for msg in messages:
+            head, marker, _ = msg["content"].partition(DYNAMIC_MARKER)
+            if marker:
+                if head:
+                    prefix.append({**msg, "content": head})
+                break
+            prefix.append(msg)
+        return prefix
+
+    def prepare_prefix_cache(self, model: str, template: str) -> None:
+        """
+        Prepara o cache do prefixo estático do template. Por padrão não faz
+        nada além de guardar o prefixo: as mensagens já são montadas com a
+        parte estática primeiro, o que basta para o cache automático de
+        prefixo dos backends que o oferecem.
+        """
+        self.prefix_messages = self.static_prefix(template)
+
+    def release_prefix_cache(self) -> None:
+        """
+        Libera recursos alocados por `prepare_prefix_cache` (se houver).
+        """
+
+    def set_limits(self, deadlines=None, max_output_tokens=None) -> None:
+        """
+        Define os prazos (models.deadlines.Deadlines) e o máximo de tokens de
+        saída usados nas próximas requisições.
+        """
+        self.deadlines = deadlines
+        self.max_output_tokens = max_output_tokens
+
+    def request_limits(self, deadlines=None, max_output_tokens=None):
+        """
+        Prazos e limite de saída de uma requisição: os passados na chamada
+        (ex: requisições empacotadas) ou, sem eles, os de set_limits.
+        """
+        return (
+            deadlines if deadlines is not None else self.deadlines,
+            max_output_tokens or self.max_output_tokens,
+        )
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        raise NotImplementedError
+
+    def complete(self, *, model: str, messages: list[dict],
+                 deadlines=None, max_output_tokens=None) -> Completion:
+        """
+        Chama `chat` e devolve o texto junto com backend, modelo e latência.
+        `deadlines`/`max_output_tokens` substituem os de set_limits só nesta
+        chamada; clientes que só implementam `chat` usam os de set_limits.
+        """
+        start = time.perf_counter()
+        text = self.chat(model=model, messages=messages)
+        return Completion(
+            text=text,
+            backend=self.name,
+            model=model,
+            latency_s=time.perf_counter() - start,
+        )
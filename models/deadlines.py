@@ -0,0 +1,84 @@
+import threading
+from dataclasses import dataclass
+
+# Limite de tokens de saída por tipo de prompt: chain_of_thoughts tende a
+# gerar mais texto antes do bloco de código
+DEFAULT_MAX_OUTPUT_TOKENS = {
+    "zero_shot": 2048,
+    "one_shot": 2048,
+    "chain_of_thoughts": 4096,
+}
+
+
+class RequestTimeout(TimeoutError):
+    """
+    A chamada ao backend excedeu o prazo total e foi abandonada pelo watchdog.
+    """
+
+
+@dataclass
+class Deadlines:
+    """
+    Prazos de uma requisição, em segundos (None = sem limite).
+    connect/read são repassados ao cliente HTTP de cada SDK; total é
+    garantido pelo watchdog em `call_with_deadline`.
+    """
+    connect_s: float | None = 10.0
+    read_s: float | None = None
+    total_s: float | None = 600.0
+
+    @property
+    def effective_read_s(self) -> float | None:
+        # sem streaming, a resposta só chega no fim: o read timeout nunca
+        # precisa ser maior que o prazo total
+        if self.read_s is None:
+            return self.total_s
+        if self.total_s is None:
+            return self.read_s
+        return min(self.read_s, self.total_s)
+
+    def httpx_timeout(self):
+        import httpx
+        return httpx.Timeout(self.effective_read_s, connect=self.connect_s)
+
+
+def call_with_deadline(fn, total_s, *args, **kwargs):
+    """
+    Executa `fn` numa thread vigiada e levanta RequestTimeout se ela não
+    terminar em `total_s` segundos. A thread abandonada é daemon e termina
+    sozinha quando o read timeout do cliente HTTP estourar.
+    """
+    if not total_s:
+        return fn(*args, **kwargs)
+
+    outcome = {}
+    finished = threading.Event()
+
+    def target():
+        try:
+            outcome["value"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            finished.set()
+
+    threading.Thread(target=target, name="watchdog-call", daemon=True).start()
+    if not finished.wait(total_s):
+        raise RequestTimeout(f"sem resposta após {total_s:g}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """
+    Reconhece timeouts de qualquer SDK (httpx.TimeoutException,
+    openai.APITimeoutError, google.api_core DeadlineExceeded...) sem
+    precisar importá-los.
+    """
+    if isinstance(error, TimeoutError):
+        return True
+    return any(
+        "Timeout" in cls.__name__ or cls.__name__ == "DeadlineExceeded"
+        for cls in type(error).__mro__
+    )
@@ -1,14 +1,20 @@
 # models/gemini_client.py
 
 import os
+import threading
+import time
+from datetime import timedelta
 from dotenv import load_dotenv
 import google.generativeai as genai # <-- Nova importação
-from string import Template
-from models.base_client import BaseClient # Assumindo que esta classe existe e tem find_pattern
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import caching
+from models.base_client import BaseClient, Completion # Assumindo que esta classe existe e tem find_pattern
 
 load_dotenv()
 
 class GeminiClient(BaseClient):
+    name = "gemini"
+
     def __init__(self):
         # Para o Google AI SDK, geralmente usamos uma API Key
         # Ou, se for para usar via Vertex AI (mais complexo), a autenticação é automática
@@ -32,13 +38,21 @@ class GeminiClient(BaseClient):
             # No entanto, a classe ChatModel não existe aqui, usaremos o genai.GenerativeModel
         
         genai.configure(api_key=gemini_api_key)
+        self.prefix_cache = None
+        self.prefix_history = []
+        self.prefix_cache_ttl = None
+        self.prefix_cache_renew_at = 0.0
+        self._cache_lock = threading.Lock()
 
 
     def generate_prompt(self, template: str, **kwargs) -> list[dict]:
         """
         Extrai os blocos SYSTEM_CONFIG, USER_CONFIG e ASSISTANT_CONFIG do template,
-        preenche com kwargs usando string.Template e retorna lista de mensagens.
+        já com os placeholders substituídos, e retorna a lista de mensagens.
         """
+        # substitui os placeholders no formato {removed_chunk} usados pelos templates
+        template = super().generate_prompt(template, **kwargs)
+
         # encontra trechos
         system_raw = self.find_pattern(template, "SYSTEM_CONFIG")
         user_raw = self.find_pattern(template, "USER_CONFIG")
@@ -51,9 +65,10 @@ class GeminiClient(BaseClient):
         user_tpl = user_raw[0]
         assistant_tpl = assist_raw[0] if assist_raw else None
 
-        # usa string.Template para não confundir chaves literais
-        sys_msg = Template(system_tpl).safe_substitute(**kwargs)
-        usr_msg = Template(user_tpl).safe_substitute(**kwargs)
+        # os placeholders já foram substituídos acima; um segundo passe com
+        # string.Template trocaria "$$" por "$" no código do usuário
+        sys_msg = system_tpl
+        usr_msg = user_tpl
 
         messages = []
 
@@ -77,7 +92,7 @@ class GeminiClient(BaseClient):
 
 
         if assistant_tpl:
-            ast_msg = Template(assistant_tpl).safe_substitute(**kwargs)
+            ast_msg = assistant_tpl
             # No google.generativeai, o role para o assistente é 'model'
             messages.append({"role": "model", "content": ast_msg})
         
@@ -85,10 +100,72 @@ class GeminiClient(BaseClient):
 
         return messages
 
-    def chat(self, *, model: str, messages: list[dict]) -> str:
+    def prepare_prefix_cache(self, model: str, template: str, ttl_minutes: int = 60) -> None:
         """
-        Envia as mensagens para o Gemini usando o Google AI SDK (google.generativeai)
-        e retorna apenas o texto da resposta.
+        Cria um cache de contexto explícito com a parte estática do prompt
+        (instruções + exemplo). O Gemini exige um mínimo de tokens para criar
+        o cache; se o prefixo for pequeno demais, segue sem cache. O TTL é
+        renovado durante o run (ver _renew_prefix_cache).
+        """
+        super().prepare_prefix_cache(model, template)
+        self.prefix_history = self.format_history(self.prefix_messages)
+        self.prefix_cache_ttl = timedelta(minutes=ttl_minutes)
+        try:
+            self.prefix_cache = caching.CachedContent.create(
+                model=model if model.startswith("models/") else f"models/{model}",
+                contents=self.prefix_history,
+                ttl=self.prefix_cache_ttl,
+            )
+            self.prefix_cache_renew_at = time.monotonic() + self.prefix_cache_ttl.total_seconds() / 2
+            print(f"✅ Cache de contexto do Gemini criado: {self.prefix_cache.name}")
+        except Exception as e:
+            self.prefix_cache = None
+            print(f"⚠️ Não foi possível criar o cache de contexto do Gemini, seguindo sem cache: {e}")
+
+    def _renew_prefix_cache(self) -> None:
+        """
+        Na metade do TTL, estende o cache por mais um TTL inteiro: o run pode
+        durar mais que o TTL com que o cache foi criado.
+        """
+        with self._cache_lock:
+            cache = self.prefix_cache
+            if cache is None or time.monotonic() < self.prefix_cache_renew_at:
+                return
+            self.prefix_cache_renew_at = time.monotonic() + self.prefix_cache_ttl.total_seconds() / 2
+        try:
+            cache.update(ttl=self.prefix_cache_ttl)
+        except Exception as e:
+            print(f"⚠️ Não foi possível renovar o cache de contexto do Gemini: {e}")
+
+    def _drop_prefix_cache(self, error: Exception) -> None:
+        """
+        O cache expirou ou foi removido: as próximas linhas seguem sem cache.
+        """
+        with self._cache_lock:
+            if self.prefix_cache is None:
+                return
+            self.prefix_cache = None
+        print(f"⚠️ Cache de contexto do Gemini indisponível, seguindo sem cache: {error}")
+
+    @staticmethod
+    def _is_cache_error(error: Exception) -> bool:
+        # cache expirado/removido: 404, ou 403 "CachedContent not found (or permission denied)"
+        return (
+            isinstance(error, (google_exceptions.NotFound, google_exceptions.PermissionDenied))
+            or "cachedcontent" in str(error).lower()
+        )
+
+    def release_prefix_cache(self) -> None:
+        if self.prefix_cache is not None:
+            try:
+                self.prefix_cache.delete()
+            except Exception as e:
+                print(f"⚠️ Erro ao remover o cache de contexto do Gemini: {e}")
+            self.prefix_cache = None
+
+    def format_history(self, messages: list[dict]) -> list[dict]:
+        """
+        Converte as mensagens para o formato do genai ({"role", "parts"}).
         """
         # O Google AI SDK espera um histórico de mensagens que alterna 'user' e 'model'.
         # O 'system_context' não é um 'role' separado no histórico de chat para este SDK,
@@ -116,13 +193,63 @@ class GeminiClient(BaseClient):
             # Mapeia 'assistant' para 'model'
             role = 'model' if msg["role"] == 'assistant' else msg["role"]
             formatted_history.append({"role": role, "parts": [msg["content"]]})
+        return formatted_history
+
+    def split_cached_prefix(self, formatted_history: list[dict]) -> list[dict] | None:
+        """
+        Se o histórico começa com o prefixo em cache, retorna só o restante
+        (o que precisa ser enviado junto com o cache); senão retorna None.
+        """
+        prefix = self.prefix_history
+        if not prefix or len(formatted_history) < len(prefix):
+            return None
+        last = len(prefix) - 1
+        if formatted_history[:last] != prefix[:last]:
+            return None
+        head = prefix[last]["parts"][0]
+        partial = formatted_history[last]
+        if partial["role"] != prefix[last]["role"] or not partial["parts"][0].startswith(head):
+            return None
+        tail = partial["parts"][0][len(head):]
+        rest = formatted_history[last + 1:]
+        if tail:
+            rest = [{"role": partial["role"], "parts": [tail]}] + rest
+        return rest or None
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        """
+        Envia as mensagens para o Gemini usando o Google AI SDK (google.generativeai)
+        e retorna apenas o texto da resposta.
+        """
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict],
+                 deadlines=None, max_output_tokens=None) -> Completion:
+        start = time.perf_counter()
+        request_kwargs = self._request_kwargs(*self.request_limits(deadlines, max_output_tokens))
+        formatted_history = self.format_history(messages)
 
         # O último item em formatted_history deve ser a mensagem do usuário que queremos enviar agora
         # E o restante é o histórico.
         
         # Se o `formatted_history` tiver apenas uma mensagem (a do usuário atual), é um chat de um turno.
         # Se tiver mais, é um chat multi-turn.
-        
+
+        # Com cache de contexto, só a parte variável do prompt é enviada; se
+        # o cache não existir mais, a linha é reenviada sem ele
+        self._renew_prefix_cache()
+        cache = self.prefix_cache
+        rest = self.split_cached_prefix(formatted_history) if cache else None
+        if rest is not None:
+            try:
+                cached_model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+                response = cached_model.generate_content(rest, **request_kwargs)
+                return self._completion(response, model, start)
+            except Exception as e:
+                if not self._is_cache_error(e):
+                    raise
+                self._drop_prefix_cache(e)
+
         # Instancia o modelo
         # Note: 'model' aqui será 'gemini-pro', 'gemini-pro-vision', etc.
         gemini_model = genai.GenerativeModel(model)
@@ -138,7 +265,34 @@ class GeminiClient(BaseClient):
         chat = gemini_model.start_chat(history=conversation_history)
         
         # Envia a mensagem mais recente do usuário
-        response = chat.send_message(user_current_prompt)
+        response = chat.send_message(user_current_prompt, **request_kwargs)
         
         # A resposta pode ter múltiplas "parts", mas você quer o texto
-        return response.text
\ No newline at end of file
+        return self._completion(response, model, start)
+
+    def _request_kwargs(self, deadlines, max_output_tokens) -> dict:
+        """
+        Limite de tokens de saída e prazo da requisição no formato do genai.
+        """
+        kwargs = {}
+        if max_output_tokens:
+            kwargs["generation_config"] = {"max_output_tokens": max_output_tokens}
+        if deadlines is not None and deadlines.total_s:
+            kwargs["request_options"] = {"timeout": deadlines.total_s}
+        return kwargs
+
+    def _completion(self, response, model: str, start: float) -> Completion:
+        completion = Completion(
+            text=response.text,
+            backend=self.name,
+            model=model,
+            latency_s=time.perf_counter() - start,
+        )
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            cached = usage.cached_content_token_count or 0
+            completion.input_tokens = usage.prompt_token_count
+            completion.cached_input_tokens = cached
+            completion.uncached_input_tokens = usage.prompt_token_count - cached
+            completion.output_tokens = usage.candidates_token_count
+        return completion
\ No newline at end of file
@@ -1,17 +1,22 @@
 import os
+import time
 from openai import OpenAI
 from dotenv import load_dotenv
 
-from models.base_client import BaseClient
+from models.base_client import BaseClient, Completion
 
 load_dotenv()
 
 class GPTClient(BaseClient):
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
+    name = "gpt"
+    # max_tokens é recusado pelos modelos de raciocínio da OpenAI (o1, o3...)
+    output_cap_param = "max_completion_tokens"
+
+    def __init__(self, api_key=None, base_url=None):
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("Defina OPENAI_API_KEY no seu .env")
-        self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
 
     def generate_prompt(self, template, **kwargs):
         # usa o replace seguro do BaseClient
@@ -43,7 +48,37 @@ class GPTClient(BaseClient):
             removed_chunk=snippet,
             commit_date=args.COMMIT_DATE
         )
+        return self.chat(model=args.VERSION, messages=messages)
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict],
+                 deadlines=None, max_output_tokens=None) -> Completion:
+        # O cache de prefixo da OpenAI é automático: basta que o início das
+        # mensagens (system + exemplo) seja idêntico entre as requisições.
+        start = time.perf_counter()
+        deadlines, max_output_tokens = self.request_limits(deadlines, max_output_tokens)
+        kwargs = {}
+        if deadlines is not None:
+            kwargs["timeout"] = deadlines.httpx_timeout()
+        if max_output_tokens:
+            kwargs[self.output_cap_param] = max_output_tokens
         resp = self.client.chat.completions.create(
-            model=args.VERSION, messages=messages
+            model=model, messages=messages, **kwargs
+        )
+        completion = Completion(
+            text=resp.choices[0].message.content,
+            backend=self.name,
+            model=model,
+            latency_s=time.perf_counter() - start,
         )
-        return resp.choices[0].message.content
+        usage = resp.usage
+        if usage is not None:
+            details = usage.prompt_tokens_details
+            cached = (details.cached_tokens if details else None) or 0
+            completion.input_tokens = usage.prompt_tokens
+            completion.cached_input_tokens = cached
+            completion.uncached_input_tokens = usage.prompt_tokens - cached
+            completion.output_tokens = usage.completion_tokens
+        return completion
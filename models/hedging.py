@@ -0,0 +1,259 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import replace
+
+from models.deadlines import RequestTimeout
+
+
+class RequestBudget:
+    """
+    Orçamento de concorrência e taxa compartilhado por todas as chamadas do run.
+    Tanto a tentativa principal quanto as duplicadas (hedge) consomem um slot.
+    """
+    def __init__(self, max_in_flight: int = 2, max_rps: float | None = None):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight deve ser >= 1")
+        self.max_in_flight = max_in_flight
+        self.max_rps = max_rps
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def acquire(self, blocking: bool = True, deadline: float | None = None) -> bool:
+        """
+        Reserva um slot e respeita o intervalo mínimo entre requisições.
+        Com blocking=False, não espera: retorna False se não houver folga agora.
+        Com `deadline` (instante de time.monotonic()), espera no máximo até
+        ele e retorna False se não conseguir começar a tempo.
+        """
+        if not blocking:
+            acquired = self._slots.acquire(blocking=False)
+        elif deadline is None:
+            acquired = self._slots.acquire()
+        else:
+            acquired = self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        if not acquired:
+            return False
+        if not self.max_rps:
+            return True
+
+        interval = 1.0 / self.max_rps
+        with self._lock:
+            now = time.monotonic()
+            wait_s = self._next_start - now
+            late = deadline is not None and now + max(wait_s, 0.0) >= deadline
+            if (wait_s > 0 and not blocking) or late:
+                self._slots.release()
+                return False
+            self._next_start = max(now, self._next_start) + interval
+        if wait_s > 0:
+            time.sleep(wait_s)
+        return True
+
+    def release(self) -> None:
+        self._slots.release()
+
+
+# Backends que recebem mensagens no formato de chat da OpenAI
+# ({"role": ..., "content": ...}, com system): podem servir de fallback uns dos outros
+CHAT_MESSAGE_BACKENDS = {"gpt", "ollama", "openai_compat"}
+
+
+def compatible_backends(primary: str, fallback: str) -> bool:
+    """
+    Diz se as mensagens montadas para `primary` podem ser enviadas a `fallback`.
+    """
+    return primary == fallback or (
+        primary in CHAT_MESSAGE_BACKENDS and fallback in CHAT_MESSAGE_BACKENDS
+    )
+
+
+def record_usage(ledger, completion):
+    """
+    Registra a Completion no `ledger` (se houver) e guarda o custo em
+    `completion.extra["cost"]` (None sem preço).
+    """
+    if ledger is not None:
+        completion.extra["cost"] = ledger.record(completion)
+    return completion
+
+
+class BudgetedClient:
+    """
+    Envolve um cliente sem hedging para que cada chamada também consuma um
+    slot do RequestBudget do run. Com `deadline`, a chamada que não conseguir
+    um slot até esse instante falha com RequestTimeout sem ir ao backend.
+    Os demais argumentos de `complete` (limites por chamada) vão para o cliente.
+
+    Com `ledger` (TokenLedger), cada Completion é registrada assim que chega,
+    mesmo a de uma chamada já abandonada pelo watchdog; o custo vai em
+    `completion.extra["cost"]`.
+    """
+    def __init__(self, client, budget: RequestBudget, ledger=None):
+        self.client = client
+        self.budget = budget
+        self.ledger = ledger
+
+    def __getattr__(self, attr):
+        return getattr(self.client, attr)
+
+    @property
+    def name(self):
+        return self.client.name
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict], deadline: float | None = None, **limits):
+        if not self.budget.acquire(deadline=deadline):
+            raise RequestTimeout("prazo esgotado esperando vaga no orçamento de requisições")
+        try:
+            completion = self.client.complete(model=model, messages=messages, **limits)
+        finally:
+            self.budget.release()
+        return record_usage(self.ledger, completion)
+
+
+class HedgedClient:
+    """
+    Envolve um cliente e, quando a chamada principal passa do percentil de
+    latência observado até agora no run, dispara uma duplicata (no mesmo
+    backend ou em um backend de fallback). A primeira resposta válida vence.
+
+    Com `deadline`, a tentativa principal que não conseguir um slot do
+    orçamento até esse instante falha com RequestTimeout sem ir ao backend,
+    e nenhuma duplicata é disparada depois dele.
+
+    Com `ledger` (TokenLedger), toda tentativa que termina é registrada,
+    inclusive as duplicatas perdedoras que continuam rodando depois que a
+    vencedora retorna; o custo de cada uma vai em `completion.extra["cost"]`.
+
+    O fallback recebe as mesmas mensagens do cliente principal, então deve
+    usar o mesmo formato de mensagens (gpt, ollama e openai_compat são
+    intercambiáveis entre si).
+    """
+    def __init__(
+        self,
+        primary,
+        fallback=None,
+        fallback_model: str | None = None,
+        percentile: float = 95.0,
+        min_samples: int = 10,
+        min_delay_s: float = 0.5,
+        max_hedge_ratio: float = 0.2,
+        budget: RequestBudget | None = None,
+        ledger=None,
+    ):
+        if not 0 < percentile < 100:
+            raise ValueError("percentile deve estar entre 0 e 100")
+        self.primary = primary
+        self.fallback = fallback or primary
+        self.fallback_model = fallback_model
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay_s = min_delay_s
+        self.max_hedge_ratio = max_hedge_ratio
+        self.budget = budget or RequestBudget()
+        self.ledger = ledger
+
+        self._latencies = []
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.budget.max_in_flight,
+            thread_name_prefix="hedge",
+        )
+
+    def __getattr__(self, attr):
+        # load_template, generate_prompt etc. vêm do cliente principal
+        return getattr(self.primary, attr)
+
+    @property
+    def name(self):
+        return self.primary.name
+
+    def set_limits(self, deadlines=None, max_output_tokens=None) -> None:
+        self.primary.set_limits(deadlines, max_output_tokens)
+        if self.fallback is not self.primary:
+            self.fallback.set_limits(deadlines, max_output_tokens)
+
+    def hedge_delay(self) -> float | None:
+        """
+        Atraso a partir do qual a duplicata é disparada, ou None enquanto não
+        houver amostras suficientes para estimar o percentil.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        # percentil pelo método nearest-rank
+        rank = max(0, int(round(self.percentile / 100 * len(ordered))) - 1)
+        return max(self.min_delay_s, ordered[rank])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self._requests, "hedges": self._hedges}
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict], deadline: float | None = None, **limits):
+        with self._lock:
+            self._requests += 1
+
+        primary = self._submit(self.primary, model, messages, "primary", limits, deadline=deadline)
+        if primary is None:
+            raise RequestTimeout("prazo esgotado esperando vaga no orçamento de requisições")
+        delay = self.hedge_delay()
+        if delay is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._may_hedge():
+            return primary.result()
+        if deadline is not None and time.monotonic() >= deadline:
+            # a linha já foi abandonada pelo watchdog: não vale gastar uma duplicata
+            return primary.result()
+
+        hedge_model = self.fallback_model or model
+        hedge = self._submit(self.fallback, hedge_model, messages, "hedge", limits, blocking=False)
+        if hedge is None:
+            return primary.result()
+
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # a perdedora é cancelada se ainda não começou; se já está
+                    # em execução, o resultado é descartado e o slot é liberado
+                    # quando ela terminar
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            return self._hedges < self.max_hedge_ratio * self._requests
+
+    def _submit(self, client, model, messages, attempt, limits, blocking=True, deadline=None):
+        if not self.budget.acquire(blocking=blocking, deadline=deadline):
+            return None
+        if attempt == "hedge":
+            with self._lock:
+                self._hedges += 1
+
+        def run():
+            completion = client.complete(model=model, messages=messages, **limits)
+            with self._lock:
+                self._latencies.append(completion.latency_s)
+            return record_usage(self.ledger, replace(completion, attempt=attempt))
+
+        future = self._executor.submit(run)
+        future.add_done_callback(lambda _: self.budget.release())
+        return future
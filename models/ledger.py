@@ -0,0 +1,141 @@
+import json
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class ModelPrice:
+    """
+    Preço de um modelo em dólares por milhão de tokens. Sem `cached_input`,
+    os tokens de entrada vindos do cache custam o mesmo que os demais.
+    """
+    input: float
+    output: float
+    cached_input: float | None = None
+
+    def cost(self, input_tokens: int, cached_input_tokens: int, output_tokens: int) -> float:
+        cached_price = self.input if self.cached_input is None else self.cached_input
+        uncached = input_tokens - cached_input_tokens
+        return (
+            uncached * self.input
+            + cached_input_tokens * cached_price
+            + output_tokens * self.output
+        ) / 1_000_000
+
+
+def load_prices(path: str) -> dict[str, ModelPrice]:
+    """
+    Lê a tabela de preços de um JSON no formato
+    {"gpt-4o": {"input": 2.5, "output": 10, "cached_input": 1.25}, ...}.
+    A chave pode ser o nome do modelo ou "backend:modelo".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return {model: ModelPrice(**price) for model, price in json.load(f).items()}
+
+
+class TokenLedger:
+    """
+    Contabiliza tokens, latência e custo de todas as chamadas do run, por
+    backend/modelo, e diz quando o orçamento (max_tokens e/ou max_cost) foi
+    atingido. Seguro para uso por várias threads.
+
+    `external_tokens`/`external_cost` são o gasto de outros processos do
+    mesmo run (ex: outros workers da fila), somado na checagem do orçamento.
+    As chamadas são registradas pelos clientes do models.hedging (BudgetedClient
+    e HedgedClient), uma vez por tentativa que termina.
+    """
+    def __init__(self, prices: dict[str, ModelPrice] | None = None,
+                 max_tokens: int | None = None, max_cost: float | None = None):
+        self.prices = prices or {}
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.external_tokens = 0
+        self.external_cost = 0.0
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def price_for(self, backend: str, model: str) -> ModelPrice | None:
+        return self.prices.get(f"{backend}:{model}") or self.prices.get(model)
+
+    def record(self, completion) -> float | None:
+        """
+        Registra uma Completion e retorna o custo da chamada (None sem preço).
+        """
+        # o Ollama só informa os tokens processados (sem os do KV cache)
+        input_tokens = completion.input_tokens
+        if input_tokens is None:
+            input_tokens = completion.uncached_input_tokens or 0
+        cached = completion.cached_input_tokens or 0
+        output_tokens = completion.output_tokens or 0
+
+        price = self.price_for(completion.backend, completion.model)
+        cost = price.cost(input_tokens, cached, output_tokens) if price else None
+
+        with self._lock:
+            entry = self._models.setdefault(
+                f"{completion.backend}:{completion.model}",
+                {
+                    "requests": 0,
+                    "input_tokens": 0,
+                    "cached_input_tokens": 0,
+                    "output_tokens": 0,
+                    "latency_s": 0.0,
+                    "cost": None if price is None else 0.0,
+                },
+            )
+            entry["requests"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["cached_input_tokens"] += cached
+            entry["output_tokens"] += output_tokens
+            entry["latency_s"] += completion.latency_s
+            if cost is not None:
+                entry["cost"] = (entry["cost"] or 0.0) + cost
+
+        return cost
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(e["input_tokens"] + e["output_tokens"] for e in self._models.values())
+
+    @property
+    def total_cost(self) -> float:
+        with self._lock:
+            return sum(e["cost"] or 0.0 for e in self._models.values())
+
+    @property
+    def exceeded(self) -> bool:
+        if self.max_tokens is not None and self.total_tokens + self.external_tokens >= self.max_tokens:
+            return True
+        if self.max_cost is not None and self.total_cost + self.external_cost >= self.max_cost:
+            return True
+        return False
+
+    def summary(self) -> dict:
+        """
+        Totais do run e por backend:modelo, incluindo tokens de saída por
+        segundo de latência (throughput) e custo por linha, quando houver preço.
+        """
+        with self._lock:
+            models = {key: dict(entry) for key, entry in self._models.items()}
+        for entry in models.values():
+            entry["output_tokens_per_s"] = (
+                entry["output_tokens"] / entry["latency_s"] if entry["latency_s"] else None
+            )
+            entry["cost_per_request"] = (
+                entry["cost"] / entry["requests"] if entry["cost"] is not None else None
+            )
+        return {
+            "total_tokens": self.total_tokens,
+            "total_cost": self.total_cost,
+            "max_tokens": self.max_tokens,
+            "max_cost": self.max_cost,
+            "external_tokens": self.external_tokens,
+            "external_cost": self.external_cost,
+            "budget_exceeded": self.exceeded,
+            "models": models,
+        }
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
@@ -1,9 +1,28 @@
+import os
+import time
 import ollama
-from models.base_client import BaseClient
+from models.base_client import BaseClient, Completion
+from models.ollama_pool import OllamaEndpointPool
+
+# Durações reportadas na resposta do /api/chat (viram backend_total_s, backend_load_s...)
+OLLAMA_DURATIONS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
 
 class OllamaClient(BaseClient):
-    def __init__(self):
+    name = "ollama"
+
+    def __init__(self, hosts=None, keep_alive=None, num_ctx=None):
+        # hosts: lista de URLs (ou OLLAMA_HOSTS="http://gpu1:11434,http://gpu2:11434").
+        # Sem hosts, usa o cliente padrão do módulo ollama (OLLAMA_HOST ou localhost).
+        if hosts is None and os.getenv("OLLAMA_HOSTS"):
+            hosts = [h.strip() for h in os.getenv("OLLAMA_HOSTS").split(",") if h.strip()]
         self.client = ollama
+        # clientes extras para prazos passados por chamada, um por prazo
+        self._clients = {}
+        self.pool = OllamaEndpointPool(hosts) if hosts else None
+        # keep_alive e num_ctx fixos mantêm o modelo (e o KV cache do prefixo)
+        # carregado entre as requisições; mudar num_ctx recarrega o modelo
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
 
     def generate_prompt(self, template: str, **kwargs):
         # usa o replace só das vars que passamos
@@ -38,5 +57,83 @@ class OllamaClient(BaseClient):
             removed_chunk=snippet,
             commit_date=args.COMMIT_DATE
         )
-        resp = self.client.chat(model=args.VERSION, messages=messages)
-        return resp["message"]["content"]
+        return self.chat(model=args.VERSION, messages=messages)
+
+    def set_limits(self, deadlines=None, max_output_tokens=None) -> None:
+        super().set_limits(deadlines, max_output_tokens)
+        # o SDK do Ollama só aceita timeout na criação do cliente
+        timeout = deadlines.httpx_timeout() if deadlines is not None else None
+        self.client = ollama.Client(timeout=timeout)
+        if self.pool is not None:
+            self.pool.set_timeout(timeout)
+
+    def prepare_prefix_cache(self, model: str, template: str) -> None:
+        # O Ollama reaproveita o KV cache do prefixo comum com a requisição
+        # anterior enquanto o modelo continuar carregado com o mesmo contexto.
+        super().prepare_prefix_cache(model, template)
+        if self.keep_alive is None:
+            self.keep_alive = "30m"
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict],
+                 deadlines=None, max_output_tokens=None) -> Completion:
+        start = time.perf_counter()
+        resp, host = self._chat(model, messages, deadlines, max_output_tokens)
+        completion = Completion(
+            text=resp["message"]["content"],
+            backend=self.name,
+            model=model,
+            latency_s=time.perf_counter() - start,
+        )
+        # prompt_eval_count conta apenas os tokens realmente processados; o
+        # Ollama não informa quantos vieram do KV cache
+        completion.uncached_input_tokens = resp.get("prompt_eval_count")
+        completion.output_tokens = resp.get("eval_count")
+        # durações do Ollama vêm em nanossegundos
+        for key in OLLAMA_DURATIONS:
+            if resp.get(key) is not None:
+                completion.backend_timings[f"backend_{key.removesuffix('_duration')}_s"] = resp.get(key) / 1e9
+        if host:
+            completion.extra["host"] = host
+        return completion
+
+    def _chat(self, model, messages, deadlines=None, max_output_tokens=None):
+        """
+        Retorna (resposta, host). Com pool, o host é escolhido por requisição.
+        `deadlines` diferentes dos de set_limits usam um cliente HTTP próprio
+        (o SDK só aceita timeout na criação), mas o mesmo pool de hosts.
+        """
+        max_output_tokens = max_output_tokens or self.max_output_tokens
+        kwargs = {}
+        if self.keep_alive is not None:
+            kwargs["keep_alive"] = self.keep_alive
+        options = {}
+        if self.num_ctx is not None:
+            options["num_ctx"] = self.num_ctx
+        if max_output_tokens:
+            options["num_predict"] = max_output_tokens
+        if options:
+            kwargs["options"] = options
+
+        if self.pool is None:
+            client = self.client if deadlines is None else self._client_for(None, deadlines)
+            return client.chat(model=model, messages=messages, **kwargs), None
+
+        endpoint = self.pool.acquire(model)
+        try:
+            client = endpoint.client if deadlines is None else self._client_for(endpoint.host, deadlines)
+            resp = client.chat(model=model, messages=messages, **kwargs)
+        except Exception as e:
+            self.pool.release(endpoint, model, error=e)
+            raise
+        self.pool.release(endpoint, model)
+        return resp, endpoint.host
+
+    def _client_for(self, host, deadlines):
+        key = (host, deadlines.connect_s, deadlines.effective_read_s)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._clients.setdefault(key, ollama.Client(host=host, timeout=deadlines.httpx_timeout()))
+        return client
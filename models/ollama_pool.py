@@ -0,0 +1,176 @@
+import threading
+import time
+
+import ollama
+
+
+def normalize_model_name(model: str) -> str:
+    """
+    O Ollama reporta os modelos carregados sempre com tag ("codellama:latest").
+    """
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaEndpoint:
+    def __init__(self, host: str, health_timeout_s: float):
+        self.host = host
+        self.client = ollama.Client(host=host)
+        self._health_client = ollama.Client(host=host, timeout=health_timeout_s)
+        self.outstanding = 0
+        self.failures = 0
+        self.healthy = True
+        self.retry_at = 0.0
+        self.loaded_models = set()
+        self.residency_checked_at = 0.0
+
+    def set_timeout(self, timeout) -> None:
+        self.client = ollama.Client(host=self.host, timeout=timeout)
+
+    def fetch_loaded_models(self) -> set:
+        """
+        Consulta /api/ps; também serve como health check do host.
+        """
+        resp = self._health_client.ps()
+        return {normalize_model_name(m["model"]) for m in resp["models"]}
+
+    def __repr__(self):
+        state = "ok" if self.healthy else "ejected"
+        return f"OllamaEndpoint({self.host}, {state}, outstanding={self.outstanding})"
+
+
+class OllamaEndpointPool:
+    """
+    Distribui requisições entre vários hosts Ollama.
+
+    Cada requisição vai para o host saudável com menos requisições em
+    andamento. Ter o modelo já carregado na GPU é uma preferência limitada:
+    um host com o modelo carregado só passa à frente enquanto tiver no máximo
+    `residency_slack` requisições a mais que o host menos ocupado, para que
+    hosts recém-adicionados ou readmitidos também recebam carga. Hosts que falham
+    `max_failures` vezes seguidas são ejetados e só voltam depois de passar
+    num health check, feito no máximo a cada `health_interval_s` segundos.
+    """
+    def __init__(
+        self,
+        hosts: list[str],
+        max_failures: int = 3,
+        health_interval_s: float = 30.0,
+        health_timeout_s: float = 5.0,
+        residency_ttl_s: float = 15.0,
+        residency_slack: int = 2,
+    ):
+        if not hosts:
+            raise ValueError("Informe ao menos um host Ollama")
+        self.endpoints = [OllamaEndpoint(h, health_timeout_s) for h in hosts]
+        self.max_failures = max_failures
+        self.health_interval_s = health_interval_s
+        self.residency_ttl_s = residency_ttl_s
+        self.residency_slack = residency_slack
+        self._lock = threading.Lock()
+        self._turn = 0
+
+    def set_timeout(self, timeout) -> None:
+        """
+        Recria os clientes de chat de todos os hosts com o novo timeout.
+        """
+        for endpoint in self.endpoints:
+            endpoint.set_timeout(timeout)
+
+    def acquire(self, model: str) -> OllamaEndpoint:
+        """
+        Escolhe um host para `model` e contabiliza a requisição em andamento.
+        Deve ser sempre pareado com `release`.
+        """
+        model = normalize_model_name(model)
+        self._check_ejected()
+        self._refresh_residency()
+
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            if not healthy:
+                raise RuntimeError(
+                    "Nenhum host Ollama saudável: "
+                    + ", ".join(e.host for e in self.endpoints)
+                )
+            # só os hosts perto do menos ocupado concorrem; entre eles, vale
+            # a residência do modelo e depois a carga
+            least = min(e.outstanding for e in healthy)
+            candidates = [e for e in healthy if e.outstanding <= least + self.residency_slack]
+            # desempate em rodízio para não concentrar tudo no primeiro host
+            self._turn = (self._turn + 1) % len(self.endpoints)
+            endpoint = min(
+                candidates,
+                key=lambda e: (
+                    model not in e.loaded_models,
+                    e.outstanding,
+                    (self.endpoints.index(e) - self._turn) % len(self.endpoints),
+                ),
+            )
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint: OllamaEndpoint, model: str, error: Exception | None = None) -> None:
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None:
+                endpoint.failures = 0
+                endpoint.loaded_models.add(normalize_model_name(model))
+            else:
+                self._record_failure(endpoint, error)
+
+    def _record_failure(self, endpoint: OllamaEndpoint, error: Exception) -> None:
+        # chamado com self._lock já adquirido
+        if not self._is_host_failure(error):
+            return
+        endpoint.failures += 1
+        if endpoint.healthy and endpoint.failures >= self.max_failures:
+            endpoint.healthy = False
+            endpoint.loaded_models.clear()
+            endpoint.retry_at = time.monotonic() + self.health_interval_s
+            print(f"⚠️ Host Ollama ejetado após {endpoint.failures} falhas: {endpoint.host}")
+
+    @staticmethod
+    def _is_host_failure(error: Exception) -> bool:
+        # erros 4xx (modelo inexistente, requisição inválida) não são culpa do host
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code == -1 or error.status_code >= 500
+        return True
+
+    def _check_ejected(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [e for e in self.endpoints if not e.healthy and e.retry_at <= now]
+            for endpoint in due:
+                endpoint.retry_at = now + self.health_interval_s
+
+        for endpoint in due:
+            try:
+                loaded = endpoint.fetch_loaded_models()
+            except Exception:
+                continue
+            with self._lock:
+                endpoint.healthy = True
+                endpoint.failures = 0
+                endpoint.loaded_models = loaded
+                endpoint.residency_checked_at = time.monotonic()
+            print(f"✅ Host Ollama readmitido: {endpoint.host}")
+
+    def _refresh_residency(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            stale = [
+                e for e in self.endpoints
+                if e.healthy and now - e.residency_checked_at >= self.residency_ttl_s
+            ]
+            for endpoint in stale:
+                endpoint.residency_checked_at = now
+
+        for endpoint in stale:
+            try:
+                loaded = endpoint.fetch_loaded_models()
+            except Exception as e:
+                with self._lock:
+                    self._record_failure(endpoint, e)
+                continue
+            with self._lock:
+                endpoint.loaded_models = loaded
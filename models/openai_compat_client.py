@@ -0,0 +1,23 @@
+import os
+from dotenv import load_dotenv
+
+from models.gpt_client import GPTClient
+
+load_dotenv()
+
+class OpenAICompatClient(GPTClient):
+    """
+    Cliente para qualquer servidor compatível com a API da OpenAI
+    (vLLM, LM Studio, llama.cpp server, o endpoint /v1 do Ollama etc.).
+    """
+    name = "openai_compat"
+    # nem todo servidor compatível conhece max_completion_tokens
+    output_cap_param = "max_tokens"
+
+    def __init__(self, base_url=None, api_key=None):
+        base_url = base_url or os.getenv("OPENAI_COMPAT_BASE_URL")
+        if not base_url:
+            raise RuntimeError("Defina OPENAI_COMPAT_BASE_URL no seu .env (ex: http://localhost:8000/v1)")
+        # servidores locais normalmente ignoram a chave, mas o SDK exige uma
+        api_key = api_key or os.getenv("OPENAI_COMPAT_API_KEY") or "not-needed"
+        super().__init__(api_key=api_key, base_url=base_url)
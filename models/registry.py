@@ -0,0 +1,65 @@
+import importlib
+
+# Cada backend é registrado como "modulo:Classe" (ou uma fábrica já importada).
+# Os SDKs (openai, ollama, google.generativeai) só são importados na primeira
+# vez que o backend é resolvido, e não quando o registry é carregado.
+_BACKENDS = {
+    "gpt": "models.gpt_client:GPTClient",
+    "ollama": "models.ollama_client:OllamaClient",
+    "gemini": "models.gemini_client:GeminiClient",
+    "openai_compat": "models.openai_compat_client:OpenAICompatClient",
+}
+
+# Cache das classes/fábricas já resolvidas
+_RESOLVED = {}
+
+
+def register_backend(name: str, target, replace: bool = False) -> None:
+    """
+    Registra um novo backend.
+
+    `target` pode ser uma string "pacote.modulo:Classe" (importada sob demanda)
+    ou qualquer callable que retorne um cliente com `load_template`,
+    `generate_prompt` e `chat`.
+    """
+    name = name.lower()
+    if name in _BACKENDS and not replace:
+        raise ValueError(f"Backend já registrado: {name}")
+    if isinstance(target, str) and ":" not in target:
+        raise ValueError(f"Alvo inválido para o backend {name}: use 'modulo:Classe'")
+    _BACKENDS[name] = target
+    _RESOLVED.pop(name, None)
+
+
+def available_backends() -> list[str]:
+    """
+    Retorna os nomes dos backends registrados, sem importar nenhum SDK.
+    """
+    return sorted(_BACKENDS)
+
+
+def resolve_backend(name: str):
+    """
+    Retorna a classe (ou fábrica) do backend, importando o módulo na primeira chamada.
+    """
+    name = name.lower()
+    if name in _RESOLVED:
+        return _RESOLVED[name]
+    if name not in _BACKENDS:
+        raise ValueError(f"Modelo desconhecido: {name}")
+
+    target = _BACKENDS[name]
+    if isinstance(target, str):
+        module_name, attr = target.split(":", 1)
+        module = importlib.import_module(module_name)
+        target = getattr(module, attr)
+
+    _RESOLVED[name] = target
+    return target
+
+
+def get_client(name: str, **kwargs):
+    """
+    Instancia o cliente do backend `name`, repassando `kwargs` ao construtor.
+    """
+    return resolve_backend(name)(**kwargs)
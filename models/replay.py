@@ -0,0 +1,167 @@
+"""
+Gravação e reprodução das chamadas aos backends.
+
+No modo gravação, cada requisição e o seu desfecho (resposta com latência e
+tokens, erro ou TIMEOUT) são anexados a um log JSONL (comprimido com gzip se o caminho terminar em .gz). No modo
+reprodução, as respostas vêm do log, sem rede, opcionalmente esperando a
+latência original: o pipeline inteiro roda de forma determinística com
+respostas de tamanho real.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict
+from functools import lru_cache
+
+from models.base_client import Completion
+from models.deadlines import RequestTimeout, is_timeout_error
+
+class ReplayMiss(LookupError):
+    """
+    A requisição não está no log de reprodução.
+    """
+
+
+class ReplayedError(RuntimeError):
+    """
+    Erro gravado no log, reproduzido no lugar da chamada original.
+    """
+
+
+def request_key(backend: str, model: str, messages) -> str:
+    """
+    Identifica a requisição pelo backend, modelo e mensagens exatas.
+    """
+    payload = json.dumps(
+        {"backend": backend, "model": model, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+@lru_cache(maxsize=None)
+def load_log(path: str) -> dict[str, list[dict]]:
+    """
+    Lê o log (uma vez por processo) e agrupa as entradas pela chave da requisição.
+    """
+    entries = {}
+    with _open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries.setdefault(entry["key"], []).append(entry)
+    return entries
+
+
+def offline_client(cls):
+    """
+    Instância do cliente só para montar prompts (load_template,
+    generate_prompt), sem passar pelo construtor: nada de credenciais nem
+    conexão com o backend.
+    """
+    if isinstance(cls, type):
+        return cls.__new__(cls)
+    return cls()
+
+
+class ResponseRecorder:
+    """
+    Grava no log o desfecho final de cada requisição, como ele foi para o
+    CSV: a Completion aceita ou o erro/TIMEOUT. Chamadas abandonadas pelo
+    watchdog ficam como TIMEOUT mesmo que a resposta chegue depois, então a
+    reprodução dá o mesmo resultado por linha.
+
+    O arquivo fica aberto durante o run (um único membro gzip com .gz);
+    chame `close()` no fim.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = _open(path, "a")
+        self._lock = threading.Lock()
+
+    def record(self, backend: str, model: str, messages, latency_s: float,
+               completion: Completion | None = None, error: Exception | None = None) -> None:
+        entry = {
+            "key": request_key(backend, model, messages),
+            "backend": backend,
+            "model": model,
+            "latency_s": latency_s,
+        }
+        if error is not None:
+            entry["error"] = str(error)
+            entry["timeout"] = is_timeout_error(error)
+        else:
+            entry["completion"] = asdict(completion)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class ReplayClient:
+    """
+    Serve as respostas do log no lugar de `prompt_client`, que só é usado
+    para montar os prompts. Requisições repetidas recebem as respostas na
+    ordem em que foram gravadas (a última se repete quando acabam).
+
+    `latency_factor` multiplica a latência gravada (0 = sem espera,
+    1 = latência original).
+    """
+    def __init__(self, prompt_client, path: str, latency_factor: float = 0.0):
+        self.prompt_client = prompt_client
+        self.entries = load_log(path)
+        self.latency_factor = latency_factor
+        self._served = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        return getattr(self.prompt_client, attr)
+
+    @property
+    def name(self):
+        return self.prompt_client.name
+
+    def set_limits(self, deadlines=None, max_output_tokens=None) -> None:
+        # os limites valem para as chamadas reais, não para a reprodução
+        pass
+
+    def prepare_prefix_cache(self, model: str, template: str) -> None:
+        pass
+
+    def release_prefix_cache(self) -> None:
+        pass
+
+    def chat(self, *, model: str, messages: list[dict]) -> str:
+        return self.complete(model=model, messages=messages).text
+
+    def complete(self, *, model: str, messages: list[dict],
+                 deadlines=None, max_output_tokens=None) -> Completion:
+        # limites por chamada, como os de set_limits, não se aplicam à reprodução
+        key = request_key(self.name, model, messages)
+        recorded = self.entries.get(key)
+        if not recorded:
+            raise ReplayMiss(f"Requisição não gravada ({self.name}/{model}, chave {key[:12]})")
+        with self._lock:
+            n = self._served.get(key, 0)
+            self._served[key] = n + 1
+        entry = recorded[min(n, len(recorded) - 1)]
+
+        if self.latency_factor:
+            time.sleep(entry["latency_s"] * self.latency_factor)
+        if "error" in entry:
+            if entry.get("timeout"):
+                raise RequestTimeout(entry["error"])
+            raise ReplayedError(entry["error"])
+        return Completion(**entry["completion"])
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Estatísticas agregadas de todas as configurações modelo × prompt de uma vez:
+
+- CodeBLEU em nível de corpus (uma única chamada ao calc_codebleu por arquivo);
+- intervalos de confiança por bootstrap pareado e testes de significância
+  entre todas as configurações, vetorizados com NumPy.
+
+Uso:
+    python -m scripts.aggregate_metrics --resultados scripts/metrics_results_*.csv
+    python -m scripts.aggregate_metrics --corpus output/processed_files/*_limpo.csv
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from scripts.shared_reference import SharedReferenceDataset, dataset_worker, inicializar_worker
+
+CAMINHO_BASE = os.path.dirname(os.path.dirname(os.path.abspath(os.path.realpath(__file__))))
+CAMINHO_DESENVOLVEDOR_CSV = os.path.join(CAMINHO_BASE, "input", "todas_as_migracoes_unificadas.csv")
+CAMINHO_SAIDA = os.path.join(CAMINHO_BASE, "scripts")
+
+
+def nome_configuracao(caminho: str) -> str:
+    """
+    'all_migrated_ollama_codellama_one_shot_limpo.csv' → 'ollama_codellama_one_shot'
+    """
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    for prefixo in ("all_migrated_", "test_small_migrated_", "metrics_results_"):
+        if nome.startswith(prefixo):
+            nome = nome[len(prefixo):]
+    if nome.endswith("_limpo"):
+        nome = nome[:-len("_limpo")]
+    return nome
+
+
+def codebleu_corpus(caminho_llm: str, dataset: SharedReferenceDataset) -> dict:
+    """
+    CodeBLEU do arquivo inteiro em uma chamada: referências = added_chunk do
+    desenvolvedor, predições = migrated_code da LLM, pareados pela ordem das linhas.
+    """
+    from codebleu import calc_codebleu
+
+    df_llm = pd.read_csv(caminho_llm)
+    n = min(len(df_llm), len(dataset))
+    referencias = pd.Series(dataset.coluna("added_chunk", 0, n)).str.strip()
+    predicoes = df_llm["migrated_code"].iloc[:n].fillna("").astype(str).str.strip()
+    validos = (referencias != "").to_numpy() & (predicoes != "").to_numpy()
+
+    resultado = calc_codebleu(
+        references=referencias[validos].tolist(),
+        predictions=predicoes[validos].tolist(),
+        lang="javascript",
+    )
+    return {"configuracao": nome_configuracao(caminho_llm), "n": int(validos.sum()), **resultado}
+
+
+def codebleu_corpus_seguro(caminho_llm: str, dataset: SharedReferenceDataset | None = None):
+    """
+    Retorna (caminho, resultado, erro) sem deixar a exceção derrubar os demais
+    arquivos. Sem `dataset`, usa o dataset compartilhado do worker: só o
+    caminho é serializado para o processo, as referências vêm da shared memory.
+    """
+    try:
+        return caminho_llm, codebleu_corpus(caminho_llm, dataset if dataset is not None else dataset_worker()), None
+    except Exception as e:
+        return caminho_llm, None, e
+
+
+def carregar_matriz(arquivos: list[str], coluna: str):
+    """
+    Lê a coluna de métrica por linha de cada arquivo de resultados e monta a
+    matriz configurações × linhas, alinhada pelo `identificador` (a posição
+    da linha no CSV de entrada, gravada pelo calculate_codebleu_only.py).
+    Só ficam as linhas com valor em todas as configurações (comparação pareada).
+    """
+    series = {}
+    for caminho in arquivos:
+        df = pd.read_csv(caminho)
+        if coluna not in df.columns:
+            print(f"⚠️ Coluna '{coluna}' não encontrada em {os.path.basename(caminho)}, pulando.")
+            continue
+        if "identificador" not in df.columns:
+            raise SystemExit(f"⚠️ {os.path.basename(caminho)} não tem a coluna 'identificador' para parear as linhas.")
+        nome = nome_configuracao(caminho)
+        if nome in series:
+            raise SystemExit(
+                f"⚠️ Configuração repetida: {nome}. Gere um arquivo por configuração "
+                "(calculate_codebleu_only.py --llm-csv ... --saida ...)."
+            )
+        series[nome] = pd.Series(df[coluna].to_numpy(dtype=float), index=df["identificador"])
+
+    combinado = pd.DataFrame(series).dropna()
+    return list(combinado.columns), combinado.to_numpy().T
+
+
+def bootstrap_pareado(matriz: np.ndarray, n_reamostras: int = 10000, alpha: float = 0.05, seed: int = 0) -> dict:
+    """
+    Bootstrap pareado de todas as configurações ao mesmo tempo.
+
+    Cada reamostra é representada pelas contagens de cada linha (distribuição
+    multinomial), então as médias de todas as configurações em todas as
+    reamostras saem de um único produto de matrizes (k × n) @ (n × B).
+    """
+    k, n = matriz.shape
+    rng = np.random.default_rng(seed)
+    pesos = rng.multinomial(n, np.full(n, 1.0 / n), size=n_reamostras).astype(float)
+    medias = matriz @ pesos.T / n  # k × B
+
+    q = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    ic = np.percentile(medias, q, axis=1)  # 2 × k
+
+    # diferenças entre todos os pares de configurações: k × k × B
+    diferencas = medias[:, None, :] - medias[None, :, :]
+    ic_diferencas = np.percentile(diferencas, q, axis=2)  # 2 × k × k
+    # p-valor bilateral: fração das reamostras em que o sinal da diferença se inverte
+    p_valores = np.minimum(
+        1.0,
+        2 * np.minimum((diferencas <= 0).mean(axis=2), (diferencas >= 0).mean(axis=2)),
+    )
+
+    return {
+        "media": matriz.mean(axis=1),
+        "ic_inferior": ic[0],
+        "ic_superior": ic[1],
+        "diferenca": matriz.mean(axis=1)[:, None] - matriz.mean(axis=1)[None, :],
+        "diferenca_ic_inferior": ic_diferencas[0],
+        "diferenca_ic_superior": ic_diferencas[1],
+        "p_valor": p_valores,
+    }
+
+
+def resumo_bootstrap(nomes: list[str], matriz: np.ndarray, **kwargs):
+    """
+    Tabelas (DataFrames) por configuração e por par de configurações.
+    """
+    r = bootstrap_pareado(matriz, **kwargs)
+    df_config = pd.DataFrame({
+        "configuracao": nomes,
+        "n": matriz.shape[1],
+        "media": r["media"],
+        "ic_inferior": r["ic_inferior"],
+        "ic_superior": r["ic_superior"],
+    }).sort_values("media", ascending=False)
+
+    pares = []
+    for i, j in combinations(range(len(nomes)), 2):
+        pares.append({
+            "configuracao_a": nomes[i],
+            "configuracao_b": nomes[j],
+            "diferenca": r["diferenca"][i, j],
+            "ic_inferior": r["diferenca_ic_inferior"][i, j],
+            "ic_superior": r["diferenca_ic_superior"][i, j],
+            "p_valor": r["p_valor"][i, j],
+        })
+    return df_config, pd.DataFrame(pares)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estatísticas agregadas (CodeBLEU de corpus e bootstrap pareado) entre configurações"
+    )
+    parser.add_argument(
+        "--resultados",
+        nargs="*",
+        default=[],
+        help="CSVs de métricas por linha (saída do calculate_codebleu_only.py), um por configuração"
+    )
+    parser.add_argument(
+        "--coluna",
+        default="codebleu_llm_vs_dev",
+        help="métrica comparada no bootstrap (padrão: codebleu_llm_vs_dev)"
+    )
+    parser.add_argument(
+        "--corpus",
+        nargs="*",
+        default=[],
+        help="CSVs limpos da LLM para o CodeBLEU em nível de corpus"
+    )
+    parser.add_argument("--reamostras", type=int, default=10000, help="número de reamostras do bootstrap")
+    parser.add_argument("--alpha", type=float, default=0.05, help="nível de significância (padrão: 0.05)")
+    parser.add_argument("--seed", type=int, default=0, help="semente do gerador aleatório")
+    parser.add_argument("--saida", default=CAMINHO_SAIDA, help="pasta onde salvar as tabelas")
+    parser.add_argument(
+        "--processos",
+        type=int,
+        default=1,
+        help="processos para o CodeBLEU de corpus (um arquivo por processo)"
+    )
+    args = parser.parse_args()
+
+    if not args.resultados and not args.corpus:
+        parser.error("informe --resultados e/ou --corpus")
+    os.makedirs(args.saida, exist_ok=True)
+
+    if args.corpus:
+        print("🔄 Calculando CodeBLEU em nível de corpus...")
+        # o dataset de referência é carregado uma vez e compartilhado com os workers
+        dataset = SharedReferenceDataset.criar_shared_memory(CAMINHO_DESENVOLVEDOR_CSV)
+        try:
+            if args.processos > 1:
+                with ProcessPoolExecutor(
+                    max_workers=args.processos,
+                    initializer=inicializar_worker,
+                    initargs=(dataset.nome,),
+                ) as executor:
+                    resultados = list(executor.map(codebleu_corpus_seguro, args.corpus))
+            else:
+                resultados = [codebleu_corpus_seguro(c, dataset) for c in args.corpus]
+        finally:
+            dataset.close()
+            dataset.unlink()
+
+        linhas = []
+        for caminho, resultado, erro in resultados:
+            if erro is not None:
+                print(f"❌ Erro no CodeBLEU de corpus de {os.path.basename(caminho)}: {erro}")
+                continue
+            linhas.append(resultado)
+            print(f"   • {resultado['configuracao']}: {resultado['codebleu']:.4f}")
+        if linhas:
+            caminho = os.path.join(args.saida, "aggregate_codebleu_corpus.csv")
+            pd.DataFrame(linhas).to_csv(caminho, index=False)
+            print(f"✅ CodeBLEU de corpus salvo em: {caminho}")
+
+    if args.resultados:
+        nomes, matriz = carregar_matriz(args.resultados, args.coluna)
+        if not nomes or matriz.shape[1] == 0:
+            raise SystemExit("⚠️ Nenhuma linha com a métrica em todas as configurações.")
+
+        print(f"\n🔄 Bootstrap pareado: {len(nomes)} configurações × {matriz.shape[1]} linhas, {args.reamostras} reamostras...")
+        df_config, df_pares = resumo_bootstrap(
+            nomes, matriz, n_reamostras=args.reamostras, alpha=args.alpha, seed=args.seed
+        )
+        nivel = int(round(100 * (1 - args.alpha)))
+        print(f"\n📈 {args.coluna} (média e IC de {nivel}%):")
+        for linha in df_config.itertuples():
+            print(f"   • {linha.configuracao}: {linha.media:.4f} [{linha.ic_inferior:.4f}, {linha.ic_superior:.4f}]")
+
+        significativos = df_pares[df_pares["p_valor"] < args.alpha]
+        print(f"\n📊 {len(significativos)} de {len(df_pares)} pares com diferença significativa (p < {args.alpha}).")
+
+        caminho_config = os.path.join(args.saida, f"aggregate_{args.coluna}_configuracoes.csv")
+        caminho_pares = os.path.join(args.saida, f"aggregate_{args.coluna}_pares.csv")
+        df_config.to_csv(caminho_config, index=False)
+        df_pares.to_csv(caminho_pares, index=False)
+        print(f"✅ Tabelas salvas em: {caminho_config} e {caminho_pares}")
+
+
+if __name__ == "__main__":
+    main()
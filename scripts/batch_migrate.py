@@ -1,20 +1,505 @@
 #!/usr/bin/env python3
 import argparse
 import pandas as pd
-from models.gpt_client import GPTClient
-from models.ollama_client import OllamaClient
-from models.gemini_client import GeminiClient
+from models.deadlines import (
+    DEFAULT_MAX_OUTPUT_TOKENS,
+    Deadlines,
+    call_with_deadline,
+    is_timeout_error,
+)
+from models.hedging import (
+    CHAT_MESSAGE_BACKENDS,
+    BudgetedClient,
+    HedgedClient,
+    RequestBudget,
+    compatible_backends,
+)
+from models.ledger import TokenLedger, load_prices
+from models.registry import available_backends, get_client, resolve_backend
+from models.replay import ReplayClient, ResponseRecorder, offline_client
+from scripts.code_checks import gate_failure, get_parser
+from scripts.packing import build_packed_chunk, pack_rows, split_packed_response
+from scripts.records import iter_migration_rows, migration_rows_to_dataframe
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def get_client(model_name: str):
-    model_name = model_name.lower()
-    if model_name == "gpt":
-        return GPTClient()
-    if model_name == "ollama":
-        return OllamaClient()
-    if model_name == "gemini":
-        return GeminiClient()
-    raise ValueError(f"Modelo desconhecido: {model_name}")
+
+def migrate_row(client, template, version, chunk, date, record_attempt=False, timeout=None, recorder=None,
+                limits=None):
+    """
+    Gera o prompt de uma linha e chama a LLM.
+    Retorna um dicionário com `migrated_code`, `status` (OK, ERROR ou TIMEOUT)
+    e metadados da chamada. Com `timeout`, a chamada é abandonada pelo
+    watchdog depois desse número de segundos. Tokens e custo entram na
+    contabilidade do run pelo próprio cliente (ver build_ledger); com
+    `recorder` (--record), o desfecho da requisição vai para o log de reprodução.
+    `limits` ({"deadlines", "max_output_tokens"}) substitui os limites do
+    cliente só nesta chamada.
+    """
+    # monta as mensagens (system + user (+assistant, se one_shot))
+    messages = client.generate_prompt(
+        template,
+        commit_date   = date,
+        removed_chunk = chunk,
+    )
+    result = {}
+    # o prazo vale também para a espera por um slot do orçamento: uma linha
+    # abandonada pelo watchdog enquanto espera não chega a chamar o backend
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def call():
+        return client.complete(model=version, messages=messages, deadline=deadline, **(limits or {}))
+
+    # chama a API
+    start = time.perf_counter()
+    try:
+        completion = call_with_deadline(call, timeout)
+        cost = completion.extra.get("cost")
+        if recorder is not None:
+            recorder.record(client.name, version, messages, completion.latency_s, completion=completion)
+        result["migrated_code"] = completion.text
+        result["status"] = "OK"
+        if record_attempt:
+            # registra qual tentativa venceu, para o run ser reproduzível
+            result["attempt"] = f"{completion.attempt}:{completion.backend}:{completion.model}"
+        if "host" in completion.extra:
+            result["host"] = completion.extra["host"]
+        for key in ("input_tokens", "cached_input_tokens", "uncached_input_tokens", "output_tokens"):
+            if getattr(completion, key) is not None:
+                result[key] = getattr(completion, key)
+        result.update(completion.backend_timings)
+        if cost is not None:
+            result["cost"] = cost
+    except Exception as e:
+        if recorder is not None:
+            recorder.record(client.name, version, messages, time.perf_counter() - start, error=e)
+        if is_timeout_error(e):
+            result["migrated_code"] = f"TIMEOUT: {e}"
+            result["status"] = "TIMEOUT"
+        else:
+            result["migrated_code"] = f"ERROR: {e}"
+            result["status"] = "ERROR"
+    return result
+
+
+def migrate_row_cascade(tiers, template, chunk, date, record_attempt=False, timeout=None, ledger=None,
+                        recorder=None):
+    """
+    Modo cascata: envia a linha ao primeiro tier (modelo rápido/barato) e só
+    escala para o próximo se a resposta reprovar nos gates rápidos (bloco de
+    código, JavaScript válido, async/await sem .then( residual).
+    A resposta do último tier é aceita de qualquer forma, assim como a do
+    tier atual quando o orçamento do run já foi atingido.
+    """
+    reasons = []
+    for n, (client, version) in enumerate(tiers):
+        result = migrate_row(
+            client, template, version, chunk, date,
+            record_attempt=record_attempt, timeout=timeout, recorder=recorder,
+        )
+        if result["status"] == "OK":
+            reason = gate_failure(result["migrated_code"])
+        else:
+            reason = result["status"]
+        if reason is None or n == len(tiers) - 1:
+            break
+        if ledger is not None and ledger.exceeded:
+            reasons.append(f"{n}: {reason} (orçamento atingido, sem escalar)")
+            break
+        reasons.append(f"{n}: {reason}")
+
+    result["tier"] = f"{n}:{client.name}:{version}"
+    result["escalations"] = "; ".join(reasons)
+    return result
+
+
+def run_row(tiers, template, chunk, date, args, ledger=None, recorder=None):
+    """
+    Processa uma linha com o cliente único ou, se houver --escalate-to, em cascata.
+    Se o orçamento do `ledger` já foi atingido, a linha não é enviada
+    (status BUDGET).
+    """
+    if ledger is not None and ledger.exceeded:
+        return {"migrated_code": "", "status": "BUDGET"}
+    if len(tiers) == 1:
+        client, version = tiers[0]
+        return migrate_row(
+            client, template, version, chunk, date,
+            record_attempt=args.hedge, timeout=args.total_timeout, recorder=recorder,
+        )
+    return migrate_row_cascade(
+        tiers, template, chunk, date,
+        record_attempt=args.hedge, timeout=args.total_timeout, ledger=ledger, recorder=recorder,
+    )
+
+
+def run_pack(tiers, template, rows, args, ledger=None, recorder=None):
+    """
+    Migra vários MigrationRow em uma única requisição ao primeiro tier
+    (trechos numerados entre delimitadores), com o mesmo cliente das linhas
+    avulsas e limite de saída e prazos escalados por pack_scale. Linhas cuja
+    seção falta ou veio malformada na resposta (ou, no modo cascata, reprova
+    nos gates rápidos) são reprocessadas individualmente com run_row.
+    Retorna um resultado por linha, na mesma ordem.
+    """
+    if ledger is not None and ledger.exceeded:
+        return [{"migrated_code": "", "status": "BUDGET"} for _ in rows]
+
+    client, version = tiers[0]
+    scale = pack_scale(args)
+    cap = output_cap(args)
+    packed = migrate_row(
+        client, template, version,
+        build_packed_chunk([row.removed_chunk for row in rows]), rows[0].commit_date,
+        record_attempt=args.hedge, timeout=args.total_timeout * scale, recorder=recorder,
+        limits={
+            "deadlines": build_deadlines(args, scale),
+            "max_output_tokens": round(cap * scale) if cap else None,
+        },
+    )
+    sections = {}
+    if packed["status"] == "OK":
+        sections = split_packed_response(packed["migrated_code"], len(rows))
+
+    results = []
+    for n, row in enumerate(rows, 1):
+        code = sections.get(n)
+        if code is not None and len(tiers) > 1 and gate_failure(code) is not None:
+            code = None
+        if code is None:
+            result = run_row(tiers, template, row.removed_chunk, row.commit_date, args, ledger, recorder)
+            result["pack"] = "fallback"
+        else:
+            result = {"migrated_code": code, "status": "OK", "pack": f"{rows[0].index}:{n}/{len(rows)}"}
+            # tokens e custo do pacote ficam só no resumo do ledger
+            for key in ("attempt", "host"):
+                if key in packed:
+                    result[key] = packed[key]
+        results.append(result)
+    return results
+
+
+def backend_options(args, backend):
+    """
+    Opções de construtor específicas de cada backend vindas da linha de comando.
+    """
+    options = {}
+    if backend == "ollama":
+        if args.ollama_hosts:
+            options["hosts"] = [h.strip() for h in args.ollama_hosts.split(",") if h.strip()]
+        if args.ollama_keep_alive:
+            options["keep_alive"] = args.ollama_keep_alive
+        if args.ollama_num_ctx:
+            options["num_ctx"] = args.ollama_num_ctx
+    return options
+
+
+def add_client_arguments(parser):
+    """
+    Opções de execução dos clientes, compartilhadas com scripts/work_queue.py.
+    """
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="duplica requisições lentas (acima do percentil de latência do run)"
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=95.0,
+        help="percentil de latência que dispara a duplicata (padrão: 95)"
+    )
+    parser.add_argument(
+        "--hedge-model",
+        choices=available_backends(),
+        help="backend da duplicata (padrão: o mesmo de --model)"
+    )
+    parser.add_argument(
+        "--hedge-version",
+        help="versão do modelo da duplicata (padrão: a mesma de --version)"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="máximo de requisições simultâneas no run, incluindo duplicatas e tiers "
+             "(padrão: --workers, mais 1 com --hedge)"
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        help="limite de requisições por segundo no run, incluindo duplicatas e tiers"
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=1,
+        help="quantas linhas processar em paralelo (padrão: 1)"
+    )
+    parser.add_argument(
+        "--ollama-hosts",
+        help="hosts Ollama separados por vírgula para balanceamento de carga "
+             "(ex: http://gpu1:11434,http://gpu2:11434)"
+    )
+    parser.add_argument(
+        "--ollama-keep-alive",
+        help="por quanto tempo o Ollama mantém o modelo carregado entre requisições "
+             "(ex: 30m; padrão com --prefix-cache: 30m)"
+    )
+    parser.add_argument(
+        "--ollama-num-ctx",
+        type=int,
+        help="tamanho de contexto fixo do Ollama; fixá-lo evita recarregar o modelo "
+             "e mantém o KV cache do prefixo"
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=10.0,
+        help="prazo para conectar ao backend, em segundos (padrão: 10)"
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        help="prazo de leitura da resposta, em segundos (padrão: o prazo total)"
+    )
+    parser.add_argument(
+        "--total-timeout",
+        type=float,
+        default=600.0,
+        help="prazo total por requisição; acima dele a linha fica com status TIMEOUT "
+             "(padrão: 600, 0 desativa)"
+    )
+    parser.add_argument(
+        "--max-output-tokens",
+        type=int,
+        help="máximo de tokens gerados por requisição "
+             "(padrão por prompt: " + ", ".join(f"{k}={v}" for k, v in DEFAULT_MAX_OUTPUT_TOKENS.items()) + ")"
+    )
+    parser.add_argument(
+        "--escalate-to",
+        action="append",
+        default=[],
+        metavar="BACKEND:VERSÃO",
+        help="modo cascata: tier para onde escalar as linhas que reprovarem nos gates "
+             "rápidos (ex: gpt:gpt-4o). Pode ser repetido; a ordem define os tiers."
+    )
+    parser.add_argument(
+        "--prices",
+        help="JSON com o preço de cada modelo em US$ por milhão de tokens "
+             '(ex: {"gpt-4o": {"input": 2.5, "output": 10, "cached_input": 1.25}})'
+    )
+    parser.add_argument(
+        "--max-tokens-budget",
+        type=int,
+        help="orçamento de tokens (entrada + saída) do run; ao atingir, as linhas "
+             "restantes não são enviadas e ficam com status BUDGET "
+             "(na fila de trabalho, somado entre todos os workers)"
+    )
+    parser.add_argument(
+        "--max-cost",
+        type=float,
+        help="orçamento em US$ do run (requer --prices com todos os modelos usados); "
+             "ao atingir, as linhas restantes não são enviadas e ficam com status BUDGET "
+             "(na fila de trabalho, somado entre todos os workers)"
+    )
+    parser.add_argument(
+        "--record",
+        metavar="LOG",
+        help="grava cada requisição/resposta (com latência) em LOG (.jsonl ou .jsonl.gz)"
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="LOG",
+        help="reproduz as respostas gravadas em LOG, sem chamar os backends"
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=0.0,
+        help="com --replay, espera a latência gravada multiplicada por este fator "
+             "(padrão: 0, sem espera; 1 = latência original)"
+    )
+    parser.add_argument(
+        "--prefix-cache",
+        action="store_true",
+        help="cacheia no backend a parte estática do template (instruções + exemplo)"
+    )
+
+
+def backend_client(args, backend):
+    """
+    Cliente de um backend, ou a reprodução do log no lugar dele (--replay).
+    """
+    if args.replay:
+        return ReplayClient(offline_client(resolve_backend(backend)), args.replay, args.replay_latency)
+    return get_client(backend, **backend_options(args, backend))
+
+
+def build_budget(args):
+    """
+    Orçamento de concorrência e taxa do run inteiro, compartilhado por todos
+    os tiers e duplicatas. Sem --max-in-flight, o limite é --workers (mais um
+    slot para as duplicatas com --hedge).
+    """
+    max_in_flight = args.max_in_flight or args.workers + (1 if args.hedge else 0)
+    return RequestBudget(max_in_flight, args.max_rps)
+
+
+def build_client(args, backend=None, budget=None):
+    """
+    Instancia o cliente de `backend` (padrão: `args.model`) aplicando as
+    opções de execução (hosts do Ollama, hedging...). Todas as chamadas
+    consomem o `budget` do run.
+    """
+    backend = backend or args.model
+    budget = budget or build_budget(args)
+    client = backend_client(args, backend)
+    if args.hedge:
+        fallback = None
+        if args.hedge_model:
+            if not compatible_backends(backend, args.hedge_model):
+                raise SystemExit(
+                    f"⚠️ --hedge-model {args.hedge_model} não aceita as mensagens montadas para {backend} "
+                    f"(compatíveis entre si: {', '.join(sorted(CHAT_MESSAGE_BACKENDS))})"
+                )
+            fallback = backend_client(args, args.hedge_model)
+        client = HedgedClient(
+            client,
+            fallback=fallback,
+            fallback_model=args.hedge_version,
+            percentile=args.hedge_percentile,
+            budget=budget,
+        )
+    else:
+        client = BudgetedClient(client, budget)
+    client.set_limits(build_deadlines(args), output_cap(args))
+    return client
+
+
+def output_cap(args):
+    return args.max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS.get(args.prompt)
+
+
+def build_deadlines(args, scale=1.0):
+    """
+    Prazos da linha de comando, com os de leitura e total multiplicados por `scale`.
+    """
+    return Deadlines(
+        connect_s=args.connect_timeout,
+        read_s=args.read_timeout * scale if args.read_timeout else args.read_timeout,
+        total_s=args.total_timeout * scale or None,
+    )
+
+
+def pack_scale(args):
+    """
+    Quanto um pacote de até --pack-tokens tokens de entrada precisa a mais de
+    saída que uma linha: o limite de uma linha mais duas vezes a entrada do
+    pacote (código migrado de cada trecho, delimitadores e blocos markdown).
+    Multiplica o limite de tokens de saída e os prazos da requisição empacotada.
+    """
+    base = output_cap(args)
+    if not base:
+        return 1.0
+    return (base + 2 * args.pack_tokens) / base
+
+
+def build_ledger(args, tiers):
+    """
+    Contabilidade de tokens/custo do run, com o orçamento da linha de comando.
+    Com --max-cost, todo modelo que o run pode chamar (tiers e duplicatas)
+    precisa ter preço: sem preço o custo não seria contabilizado.
+    """
+    if args.max_cost is not None and not args.prices:
+        raise SystemExit("⚠️ --max-cost requer --prices")
+    prices = load_prices(args.prices) if args.prices else None
+    ledger = TokenLedger(prices, max_tokens=args.max_tokens_budget, max_cost=args.max_cost)
+    # os clientes registram cada tentativa que termina (inclusive duplicatas
+    # perdedoras e chamadas abandonadas pelo watchdog)
+    for client, _ in tiers:
+        client.ledger = ledger
+
+    if args.max_cost is not None:
+        models = set()
+        for client, version in tiers:
+            models.add((client.name, version))
+            if args.hedge:
+                models.add((args.hedge_model or client.name, args.hedge_version or version))
+        missing = sorted(f"{backend}:{model}" for backend, model in models if ledger.price_for(backend, model) is None)
+        if missing:
+            raise SystemExit(f"⚠️ --max-cost: sem preço em {args.prices} para {', '.join(missing)}")
+    return ledger
+
+
+def ledger_path(output_csv):
+    return os.path.splitext(output_csv)[0] + ".ledger.json"
+
+
+def report_ledger(ledger, path):
+    """
+    Salva o resumo da contabilidade e imprime os totais.
+    """
+    ledger.write(path)
+    summary = ledger.summary()
+    print(f"💰 {summary['total_tokens']} tokens, US$ {summary['total_cost']:.4f} (resumo em {path})")
+    if summary["budget_exceeded"]:
+        print("⚠️ Orçamento atingido: as linhas restantes ficaram com status BUDGET.")
+
+
+def build_tiers(args, budget=None):
+    """
+    Lista de (cliente, versão) em ordem de escalonamento: --model/--version
+    seguido de cada --escalate-to. Todos os tiers compartilham o mesmo `budget`.
+    """
+    if args.record and args.replay:
+        raise SystemExit("⚠️ Use --record ou --replay, não os dois.")
+    budget = budget or build_budget(args)
+    tiers = [(build_client(args, budget=budget), args.version)]
+    for spec in args.escalate_to:
+        backend, sep, version = spec.partition(":")
+        if not sep or not version or backend not in available_backends():
+            raise SystemExit(f"⚠️ --escalate-to inválido: {spec} (use BACKEND:VERSÃO)")
+        tiers.append((build_client(args, backend, budget), version))
+    if args.escalate_to and get_parser() is None:
+        print("⚠️ tree-sitter não está instalado: o gate \"JavaScript válido\" da cascata fica desativado.")
+        print("   Instale com: pip install -r requirements.txt")
+    return tiers
+
+
+def prepare_tiers(tiers, template, args):
+    if args.prefix_cache:
+        for client, version in tiers:
+            client.prepare_prefix_cache(version, template)
+
+
+def release_tiers(tiers, args):
+    if args.prefix_cache:
+        for client, _ in tiers:
+            client.release_prefix_cache()
+
+
+def write_output(rows, output_csv):
+    """
+    Salva o CSV de saída a partir dos MigrationRow processados: colunas de
+    entrada, `migrated_code` e os metadados de cada linha como colunas extras.
+    """
+    df_out = migration_rows_to_dataframe(rows)
+
+    out_dir = os.path.dirname(output_csv)
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+
+    df_out.to_csv(output_csv, index=False, encoding="utf-8")
+
+
+def apply_result(row, result):
+    """
+    Copia o resultado de run_row para o MigrationRow (código e metadados).
+    """
+    row.migrated_code = result.pop("migrated_code")
+    row.meta.update(result)
+    return row
 
 
 def main():
@@ -33,9 +518,9 @@ def main():
     )
     parser.add_argument(
         "--model", "-m",
-        choices=["gpt","ollama", "gemini"],
+        choices=available_backends(),
         required=True,
-        help="qual backend usar (gpt ou ollama)"
+        help="qual backend usar (gpt, ollama, gemini, openai_compat...)"
     )
     parser.add_argument(
         "--version", "-v",
@@ -48,67 +533,67 @@ def main():
         choices=["one_shot","zero_shot","chain_of_thoughts"],
         help="qual template usar"
     )
+    parser.add_argument(
+        "--pack-tokens",
+        type=int,
+        help="agrupa trechos pequenos em uma requisição até este total estimado de "
+             "tokens (~4 caracteres por token); linhas mal separadas na resposta "
+             "são reenviadas sozinhas. O limite de saída e os prazos do pacote "
+             "crescem com este valor"
+    )
+    parser.add_argument(
+        "--pack-snippet-tokens",
+        type=int,
+        default=256,
+        help="com --pack-tokens, trechos acima deste total estimado de tokens "
+             "vão sempre sozinhos (padrão: 256)"
+    )
+    add_client_arguments(parser)
     args = parser.parse_args()
 
     # 1) Carrega o CSV
     df = pd.read_csv(args.input_csv, encoding="utf-8", quoting=1, engine="python")
     if "removed_chunk" not in df.columns:
         raise SystemExit("⚠️ Coluna 'removed_chunk' não encontrada no CSV de entrada.")
-    # commit_date é opcional: se faltar, usamos string vazia
-    has_date = "commit_date" in df.columns
-    has_hash = "commit_hash" in df.columns
 
     # 2) Prepara cliente e template
-    client = get_client(args.model)
-    template = client.load_template(args.prompt)
+    tiers = build_tiers(args)
+    ledger = build_ledger(args, tiers)
+    recorder = ResponseRecorder(args.record) if args.record else None
+    template = tiers[0][0].load_template(args.prompt)
+    prepare_tiers(tiers, template, args)
 
     # 3) Para cada linha, gera o prompt e chama a LLM
-    migrated = []
+    # (commit_date é opcional: se faltar, fica string vazia)
     total = len(df)
-    for i, row in df.iterrows():
-        chunk = row["removed_chunk"]
-        date  = row["commit_date"] if has_date else ""
-        commit_hash = row["commit_hash"] if has_hash else ""
-        # monta as mensagens (system + user (+assistant, se one_shot))
-        messages = client.generate_prompt(
-            template,
-            commit_date   = date,
-            removed_chunk = chunk,
-        )
-        # chama a API
-        try:
-            if args.model == "gpt":
-                resp = client.client.chat.completions.create(
-                    model    = args.version,
-                    messages = messages
-                )
-                out = resp.choices[0].message.content
-            elif args.model == "ollama":
-                resp = client.client.chat(
-                    model    = args.version,
-                    messages = messages
-                )
-                out = resp["message"]["content"]
-            else:  # gemini
-                out = client.chat(model=args.version, messages=messages)
-            
-        except Exception as e:
-            out = f"ERROR: {e}"
-        print(f"[{i+1}/{total}] → ok")
-        migrated.append(out)
 
-    # 4) Escreve CSV de saída
-    # 3) adiciona ao DataFrame
-    df["migrated_code"] = migrated
+    def run(group):
+        if len(group) == 1:
+            row = group[0]
+            results = [run_row(tiers, template, row.removed_chunk, row.commit_date, args, ledger, recorder)]
+        else:
+            results = run_pack(tiers, template, group, args, ledger, recorder)
+        for row, result in zip(group, results):
+            print(f"[{row.index+1}/{total}] → {result['status'].lower()}")
+            apply_result(row, result)
+        return group
 
-    df_out = df[["removed_chunk", "migrated_code", "commit_date", "commit_hash"]]
+    if args.pack_tokens:
+        groups = pack_rows(iter_migration_rows(df), args.pack_tokens, args.pack_snippet_tokens)
+    else:
+        groups = ([row] for row in iter_migration_rows(df))
 
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            rows = [row for group in executor.map(run, groups) for row in group]
+    finally:
+        release_tiers(tiers, args)
+        if recorder is not None:
+            recorder.close()
 
-    out_dir = os.path.dirname(args.output_csv)
-    if out_dir and not os.path.exists(out_dir):
-        os.makedirs(out_dir, exist_ok=True)
-
-    df_out.to_csv(args.output_csv, index=False, encoding="utf-8")
+    # 4) Escreve CSV de saída e o resumo de tokens/custo
+    write_output(rows, args.output_csv)
+    report_ledger(ledger, ledger_path(args.output_csv))
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,49 @@
+# Uso (a partir da raiz do repositório): python -m scripts.calculate_codebleu_only
+import argparse
 import pandas as pd
 import os
 from codebleu import calc_codebleu
 
+from scripts.aggregate_metrics import nome_configuracao
+from scripts.records import (
+    CodeBLEUScores,
+    MetricResult,
+    iter_comparison_rows,
+    metric_results_to_dataframe,
+)
+
 # 1. Defina os caminhos dos arquivos de entrada e saída
 CAMINHO_BASE = os.path.dirname(os.path.dirname(os.path.abspath(os.path.realpath(__file__))))
 CAMINHO_DESENVOLVEDOR_CSV = os.path.join(CAMINHO_BASE, "input", "todas_as_migracoes_unificadas.csv")
 CAMINHO_LLM_CSV = os.path.join(CAMINHO_BASE, "output", "processed_files", "all_migrated_ollama_codellama_chain_of_thoughts_limpo.csv")
 CAMINHO_RESULTADO = os.path.join(CAMINHO_BASE, "scripts", "metrics_results_codebleu_only.csv") # Apenas CodeBLEU
 
+# Se o CSV da LLM passou por scripts/validate_migrations.py, as linhas com
+# JavaScript inválido não gastam CodeBLEU nas comparações com o código da LLM:
+# essas comparações ficam com score 0.0 e continuam nas médias, para que
+# configurações que geram código quebrado não pareçam melhores
+PULAR_LLM_INVALIDO = True
+
+# Cada configuração (modelo × prompt) precisa do seu próprio arquivo de
+# resultados para o bootstrap pareado do aggregate_metrics.py
+parser = argparse.ArgumentParser(description="CodeBLEU por linha: LLM vs desenvolvedor vs código original")
+parser.add_argument(
+    "--llm-csv",
+    help="CSV limpo da LLM (padrão: " + os.path.basename(CAMINHO_LLM_CSV) + ")"
+)
+parser.add_argument(
+    "--saida",
+    help="CSV de resultados (padrão com --llm-csv: scripts/metrics_results_<configuração>.csv)"
+)
+args = parser.parse_args()
+if args.llm_csv:
+    CAMINHO_LLM_CSV = args.llm_csv
+    CAMINHO_RESULTADO = os.path.join(
+        CAMINHO_BASE, "scripts", f"metrics_results_{nome_configuracao(args.llm_csv)}.csv"
+    )
+if args.saida:
+    CAMINHO_RESULTADO = args.saida
+
 # 2. Carregue os DataFrames
 try:
     df_desenvolvedor = pd.read_csv(CAMINHO_DESENVOLVEDOR_CSV)
@@ -52,6 +88,13 @@ elif codigo_original_col in df_llm.columns:
     df_llm_essencial = df_llm[['commit_hash', 'codigo_llm', codigo_original_col]]
     df_llm_essencial = df_llm_essencial.rename(columns={codigo_original_col: 'codigo_original'})
 
+# Coluna de validade sintática (opcional); linhas não validadas contam como válidas
+if 'js_valid' in df_llm.columns:
+    df_llm_essencial = df_llm_essencial.assign(js_valid=df_llm['js_valid'].fillna(True).astype(str) != 'False')
+    print(f"✅ Validação sintática encontrada: {int((~df_llm_essencial['js_valid']).sum())} linhas com JavaScript inválido")
+else:
+    df_llm_essencial = df_llm_essencial.assign(js_valid=True)
+
 df_dev_essencial = df_dev_essencial.reset_index(drop=True)
 df_llm_essencial = df_llm_essencial.reset_index(drop=True)
 
@@ -60,197 +103,81 @@ if len(df_dev_essencial) != len(df_llm_essencial):
     print("O DataFrame combinado terá o tamanho do menor arquivo, descartando as linhas excedentes.")
 
 df_combined = pd.concat([df_llm_essencial, df_dev_essencial], axis=1)
+# o índice não é refeito: ele continua sendo a posição da linha nos CSVs de
+# entrada e vira o `identificador`, a chave estável do bootstrap pareado
 df_combined.dropna(inplace=True)
-df_combined = df_combined.reset_index(drop=True)
 
 print(f"✅ DataFrames combinados. {len(df_combined)} entradas prontas para análise.")
 
-# 4. Prepare as listas para armazenar todas as métricas CodeBLEU
-# LLM vs Desenvolvedor
-codebleu_llm_vs_dev = []
-ngram_match_llm_vs_dev = []
-weighted_ngram_match_llm_vs_dev = []
-syntax_match_llm_vs_dev = []
-dataflow_match_llm_vs_dev = []
+# 4. Cálculo das métricas CodeBLEU, linha a linha, sobre registros compactos
+erros_processamento = []
 
-# Original vs LLM
-codebleu_original_vs_llm = []
-ngram_match_original_vs_llm = []
-weighted_ngram_match_original_vs_llm = []
-syntax_match_original_vs_llm = []
-dataflow_match_original_vs_llm = []
 
-# Original vs Desenvolvedor
-codebleu_original_vs_dev = []
-ngram_match_original_vs_dev = []
-weighted_ngram_match_original_vs_dev = []
-syntax_match_original_vs_dev = []
-dataflow_match_original_vs_dev = []
+def codebleu_ou_vazio(referencia, predicao, comparacao, commit_hash):
+    """
+    CodeBLEU de um par de códigos; em caso de erro, scores vazios (None).
+    """
+    try:
+        return CodeBLEUScores.from_result(calc_codebleu([referencia], [predicao], lang="javascript"))
+    except Exception as e:
+        print(f"❌ Erro no CodeBLEU ({comparacao}) para o commit {commit_hash}: {e}")
+        return CodeBLEUScores()
 
-erros_processamento = []
 
-# 5. Itere sobre cada linha para calcular as métricas CodeBLEU
-for index, row in df_combined.iterrows():
-    migrated_code_dev = str(row['codigo_desenvolvedor'])
-    migrated_code_llm = str(row['codigo_llm'])
-    codigo_original = str(row['codigo_original'])
-    commit_hash = row['commit_hash']
+def calcular_metricas(linhas):
+    """
+    Gera um MetricResult por ComparisonRow. Comparações que não puderam ser
+    calculadas ficam com os scores vazios.
+    """
+    for row in linhas:
+        resultado = MetricResult(row)
+        commit_hash = row.commit_hash
+        try:
+            clean_migrated_dev = row.codigo_desenvolvedor.strip()
+            clean_migrated_llm = row.codigo_llm.strip()
+            clean_original = row.codigo_original.strip()
 
-    # --- Cálculo das métricas CodeBLEU ---
-    try:
-        # Verificar se algum código está vazio
-        if not migrated_code_dev.strip() or not migrated_code_llm.strip() or not codigo_original.strip():
-            print(f"⚠️ Ignorando linha {index} do commit {commit_hash} devido a código vazio.")
-            # LLM vs Dev
-            codebleu_llm_vs_dev.append(None)
-            ngram_match_llm_vs_dev.append(None)
-            weighted_ngram_match_llm_vs_dev.append(None)
-            syntax_match_llm_vs_dev.append(None)
-            dataflow_match_llm_vs_dev.append(None)
-            # Original vs LLM
-            codebleu_original_vs_llm.append(None)
-            ngram_match_original_vs_llm.append(None)
-            weighted_ngram_match_original_vs_llm.append(None)
-            syntax_match_original_vs_llm.append(None)
-            dataflow_match_original_vs_llm.append(None)
-            # Original vs Dev
-            codebleu_original_vs_dev.append(None)
-            ngram_match_original_vs_dev.append(None)
-            weighted_ngram_match_original_vs_dev.append(None)
-            syntax_match_original_vs_dev.append(None)
-            dataflow_match_original_vs_dev.append(None)
-        else:
-            # === SIMILARIDADE DE CÓDIGO ===
-            # Limpar e preparar os códigos
-            clean_migrated_dev = migrated_code_dev.strip()
-            clean_migrated_llm = migrated_code_llm.strip()
-            clean_original = codigo_original.strip()
-            
-            # Verificar se os códigos não estão vazios após limpeza
+            # Verificar se algum código está vazio
             if not clean_migrated_dev or not clean_migrated_llm or not clean_original:
-                print(f"⚠️ Código vazio após limpeza para commit {commit_hash}")
-                # LLM vs Dev
-                codebleu_llm_vs_dev.append(None)
-                ngram_match_llm_vs_dev.append(None)
-                weighted_ngram_match_llm_vs_dev.append(None)
-                syntax_match_llm_vs_dev.append(None)
-                dataflow_match_llm_vs_dev.append(None)
-                # Original vs LLM
-                codebleu_original_vs_llm.append(None)
-                ngram_match_original_vs_llm.append(None)
-                weighted_ngram_match_original_vs_llm.append(None)
-                syntax_match_original_vs_llm.append(None)
-                dataflow_match_original_vs_llm.append(None)
-                # Original vs Dev
-                codebleu_original_vs_dev.append(None)
-                ngram_match_original_vs_dev.append(None)
-                weighted_ngram_match_original_vs_dev.append(None)
-                syntax_match_original_vs_dev.append(None)
-                dataflow_match_original_vs_dev.append(None)
+                print(f"⚠️ Ignorando linha {row.index} do commit {commit_hash} devido a código vazio.")
+                yield resultado
                 continue
-            
-            # 1. Similaridade entre código migrado pela LLM e pelo desenvolvedor
-            try:
-                codebleu_result_llm_vs_dev = calc_codebleu([clean_migrated_dev], [clean_migrated_llm], lang="javascript")
-                codebleu_llm_vs_dev.append(codebleu_result_llm_vs_dev['codebleu'])
-                ngram_match_llm_vs_dev.append(codebleu_result_llm_vs_dev['ngram_match_score'])
-                weighted_ngram_match_llm_vs_dev.append(codebleu_result_llm_vs_dev['weighted_ngram_match_score'])
-                syntax_match_llm_vs_dev.append(codebleu_result_llm_vs_dev['syntax_match_score'])
-                dataflow_match_llm_vs_dev.append(codebleu_result_llm_vs_dev['dataflow_match_score'])
-            except Exception as e:
-                print(f"❌ Erro no CodeBLEU (LLM vs Dev) para o commit {commit_hash}: {e}")
-                codebleu_llm_vs_dev.append(None)
-                ngram_match_llm_vs_dev.append(None)
-                weighted_ngram_match_llm_vs_dev.append(None)
-                syntax_match_llm_vs_dev.append(None)
-                dataflow_match_llm_vs_dev.append(None)
-            
-            # 2. Similaridade entre código original e código migrado pela LLM
-            try:
-                codebleu_result_original_vs_llm = calc_codebleu([clean_original], [clean_migrated_llm], lang="javascript")
-                codebleu_original_vs_llm.append(codebleu_result_original_vs_llm['codebleu'])
-                ngram_match_original_vs_llm.append(codebleu_result_original_vs_llm['ngram_match_score'])
-                weighted_ngram_match_original_vs_llm.append(codebleu_result_original_vs_llm['weighted_ngram_match_score'])
-                syntax_match_original_vs_llm.append(codebleu_result_original_vs_llm['syntax_match_score'])
-                dataflow_match_original_vs_llm.append(codebleu_result_original_vs_llm['dataflow_match_score'])
-            except Exception as e:
-                print(f"❌ Erro no CodeBLEU (Original vs LLM) para o commit {commit_hash}: {e}")
-                codebleu_original_vs_llm.append(None)
-                ngram_match_original_vs_llm.append(None)
-                weighted_ngram_match_original_vs_llm.append(None)
-                syntax_match_original_vs_llm.append(None)
-                dataflow_match_original_vs_llm.append(None)
-            
+
+            # JavaScript inválido (validate_migrations.py): não gasta CodeBLEU com o código da LLM
+            if PULAR_LLM_INVALIDO and not row.js_valid:
+                resultado.llm_vs_dev = CodeBLEUScores.zero()
+                resultado.original_vs_llm = CodeBLEUScores.zero()
+            else:
+                # 1. Similaridade entre código migrado pela LLM e pelo desenvolvedor
+                resultado.llm_vs_dev = codebleu_ou_vazio(
+                    clean_migrated_dev, clean_migrated_llm, "LLM vs Dev", commit_hash
+                )
+                # 2. Similaridade entre código original e código migrado pela LLM
+                resultado.original_vs_llm = codebleu_ou_vazio(
+                    clean_original, clean_migrated_llm, "Original vs LLM", commit_hash
+                )
             # 3. Similaridade entre código original e código migrado pelo desenvolvedor
-            try:
-                codebleu_result_original_vs_dev = calc_codebleu([clean_original], [clean_migrated_dev], lang="javascript")
-                codebleu_original_vs_dev.append(codebleu_result_original_vs_dev['codebleu'])
-                ngram_match_original_vs_dev.append(codebleu_result_original_vs_dev['ngram_match_score'])
-                weighted_ngram_match_original_vs_dev.append(codebleu_result_original_vs_dev['weighted_ngram_match_score'])
-                syntax_match_original_vs_dev.append(codebleu_result_original_vs_dev['syntax_match_score'])
-                dataflow_match_original_vs_dev.append(codebleu_result_original_vs_dev['dataflow_match_score'])
-            except Exception as e:
-                print(f"❌ Erro no CodeBLEU (Original vs Dev) para o commit {commit_hash}: {e}")
-                codebleu_original_vs_dev.append(None)
-                ngram_match_original_vs_dev.append(None)
-                weighted_ngram_match_original_vs_dev.append(None)
-                syntax_match_original_vs_dev.append(None)
-                dataflow_match_original_vs_dev.append(None)
+            resultado.original_vs_dev = codebleu_ou_vazio(
+                clean_original, clean_migrated_dev, "Original vs Dev", commit_hash
+            )
 
             # Log de sucesso para os primeiros itens processados
-            if index < 3:
-                print(f"✅ Similaridade calculada para commit {commit_hash[:8]}: LLM vs Dev = {codebleu_llm_vs_dev[-1]:.4f}")
-            elif index == 3:
+            if row.index < 3 and resultado.llm_vs_dev.codebleu is not None:
+                print(f"✅ Similaridade calculada para commit {commit_hash[:8]}: LLM vs Dev = {resultado.llm_vs_dev.codebleu:.4f}")
+            elif row.index == 3:
                 print("✅ Processamento em andamento...")
-            
-    except Exception as e:
-        print(f"❌ Erro inesperado no processamento para o commit {commit_hash}: {e}")
-        # LLM vs Dev
-        codebleu_llm_vs_dev.append(None)
-        ngram_match_llm_vs_dev.append(None)
-        weighted_ngram_match_llm_vs_dev.append(None)
-        syntax_match_llm_vs_dev.append(None)
-        dataflow_match_llm_vs_dev.append(None)
-        # Original vs LLM
-        codebleu_original_vs_llm.append(None)
-        ngram_match_original_vs_llm.append(None)
-        weighted_ngram_match_original_vs_llm.append(None)
-        syntax_match_original_vs_llm.append(None)
-        dataflow_match_original_vs_llm.append(None)
-        # Original vs Dev
-        codebleu_original_vs_dev.append(None)
-        ngram_match_original_vs_dev.append(None)
-        weighted_ngram_match_original_vs_dev.append(None)
-        syntax_match_original_vs_dev.append(None)
-        dataflow_match_original_vs_dev.append(None)
-        erros_processamento.append(commit_hash)
+        except Exception as e:
+            print(f"❌ Erro inesperado no processamento para o commit {commit_hash}: {e}")
+            resultado = MetricResult(row)
+            erros_processamento.append(commit_hash)
+        yield resultado
 
-# 6. Adicione todas as colunas CodeBLEU ao DataFrame combinado
-# LLM vs Dev
-df_combined['codebleu_llm_vs_dev'] = codebleu_llm_vs_dev
-df_combined['ngram_match_llm_vs_dev'] = ngram_match_llm_vs_dev
-df_combined['weighted_ngram_match_llm_vs_dev'] = weighted_ngram_match_llm_vs_dev
-df_combined['syntax_match_llm_vs_dev'] = syntax_match_llm_vs_dev
-df_combined['dataflow_match_llm_vs_dev'] = dataflow_match_llm_vs_dev
 
-# Original vs LLM
-df_combined['codebleu_original_vs_llm'] = codebleu_original_vs_llm
-df_combined['ngram_match_original_vs_llm'] = ngram_match_original_vs_llm
-df_combined['weighted_ngram_match_original_vs_llm'] = weighted_ngram_match_original_vs_llm
-df_combined['syntax_match_original_vs_llm'] = syntax_match_original_vs_llm
-df_combined['dataflow_match_original_vs_llm'] = dataflow_match_original_vs_llm
-
-# Original vs Dev
-df_combined['codebleu_original_vs_dev'] = codebleu_original_vs_dev
-df_combined['ngram_match_original_vs_dev'] = ngram_match_original_vs_dev
-df_combined['weighted_ngram_match_original_vs_dev'] = weighted_ngram_match_original_vs_dev
-df_combined['syntax_match_original_vs_dev'] = syntax_match_original_vs_dev
-df_combined['dataflow_match_original_vs_dev'] = dataflow_match_original_vs_dev
-
-# 6.1. Reorganize as colunas na ordem solicitada
-df_combined = df_combined.reset_index()
-df_combined = df_combined.rename(columns={'index': 'identificador'})
+# 5. Itere sobre os registros (sem criar uma Series por linha)
+resultados = list(calcular_metricas(iter_comparison_rows(df_combined)))
+linhas_invalidas_puladas = sum(1 for r in resultados if PULAR_LLM_INVALIDO and not r.row.js_valid)
 
+# 6. Monte o DataFrame de resultados só na saída, com as colunas na ordem solicitada
 # Definir a ordem das colunas (todas as métricas CodeBLEU)
 colunas_ordenadas = [
     'identificador',
@@ -277,8 +204,7 @@ colunas_ordenadas = [
     'dataflow_match_llm_vs_dev'
 ]
 
-# Reorganizar o DataFrame com as colunas na ordem especificada
-df_final = df_combined[colunas_ordenadas]
+df_final = metric_results_to_dataframe(resultados, colunas_ordenadas)
 
 # 7. Salve o DataFrame final em um novo CSV
 try:
@@ -319,6 +245,12 @@ try:
         print(f"   • Média Original vs LLM: {valid_rows['dataflow_match_original_vs_llm'].mean():.4f}")
         print(f"   • Média LLM vs Dev: {valid_rows['dataflow_match_llm_vs_dev'].mean():.4f}")
     
+    if linhas_invalidas_puladas:
+        print(
+            f"\n⏭️ {linhas_invalidas_puladas} linhas com JavaScript inválido não tiveram o código da LLM "
+            "avaliado pelo CodeBLEU (score 0.0 nas comparações com a LLM, incluído nas médias)."
+        )
+
     if erros_processamento:
         print(f"\n⚠️ Houve erros ao processar os seguintes commits: {list(set(erros_processamento))}")
 except Exception as e:
@@ -1,13 +1,20 @@
+# Uso (a partir da raiz do repositório): python -m scripts.calculate_metrics
 import pandas as pd
 import os
 import Levenshtein
 
+from scripts.records import MetricResult, iter_comparison_rows, metric_results_to_dataframe
+
 # 1. Defina os caminhos dos arquivos de entrada e saída
 CAMINHO_BASE = os.path.dirname(os.path.dirname(os.path.abspath(os.path.realpath(__file__))))
 CAMINHO_DESENVOLVEDOR_CSV = os.path.join(CAMINHO_BASE, "input", "todas_as_migracoes_unificadas.csv")
 CAMINHO_LLM_CSV = os.path.join(CAMINHO_BASE, "output", "processed_files", "all_migrated_ollama_codellama_chain_of_thoughts_limpo.csv")
 CAMINHO_RESULTADO = os.path.join(CAMINHO_BASE, "scripts", "metrics_results_levenshtein_only.csv") # Nome do arquivo alterado
 
+# Se o CSV da LLM passou por scripts/validate_migrations.py, as linhas com
+# JavaScript inválido ficam sem distância (não entram nas médias)
+PULAR_LLM_INVALIDO = True
+
 # 2. Carregue os DataFrames
 try:
     df_desenvolvedor = pd.read_csv(CAMINHO_DESENVOLVEDOR_CSV)
@@ -26,6 +33,12 @@ df_llm = df_llm.rename(columns={'migrated_code': 'codigo_llm'})
 df_dev_essencial = df_desenvolvedor[['codigo_desenvolvedor']]
 df_llm_essencial = df_llm[['commit_hash', 'codigo_llm']]
 
+# Coluna de validade sintática (opcional); linhas não validadas contam como válidas
+if 'js_valid' in df_llm.columns:
+    df_llm_essencial = df_llm_essencial.assign(js_valid=df_llm['js_valid'].fillna(True).astype(str) != 'False')
+else:
+    df_llm_essencial = df_llm_essencial.assign(js_valid=True)
+
 df_dev_essencial = df_dev_essencial.reset_index(drop=True)
 df_llm_essencial = df_llm_essencial.reset_index(drop=True)
 
@@ -34,36 +47,40 @@ if len(df_dev_essencial) != len(df_llm_essencial):
     print("O DataFrame combinado terá o tamanho do menor arquivo, descartando as linhas excedentes.")
 
 df_combined = pd.concat([df_llm_essencial, df_dev_essencial], axis=1)
+# o índice continua sendo a posição da linha nos CSVs de entrada
 df_combined.dropna(inplace=True)
-df_combined = df_combined.reset_index(drop=True)
 
 print(f"✅ DataFrames combinados. {len(df_combined)} entradas prontas para análise.")
 
-# 4. Prepare a lista para armazenar a métrica
-levenshtein_distances = []
+# 4. Cálculo da métrica sobre registros compactos
 erros_processamento = []
 
-# 5. Itere sobre cada linha para calcular a métrica
-for index, row in df_combined.iterrows():
-    migrated_code_dev = str(row['codigo_desenvolvedor'])
-    migrated_code_llm = str(row['codigo_llm'])
-    commit_hash = row['commit_hash']
-
-    # --- Cálculo do Levenshtein ---
-    try:
-        if not migrated_code_dev.strip() or not migrated_code_llm.strip():
-            print(f"⚠️ Ignorando linha {index} do commit {commit_hash} devido a código vazio.")
-            levenshtein_distances.append(None)
-        else:
-            distance = Levenshtein.distance(migrated_code_dev, migrated_code_llm)
-            levenshtein_distances.append(distance)
-    except Exception as e:
-        print(f"❌ Erro inesperado no Levenshtein para o commit {commit_hash}: {e}")
-        levenshtein_distances.append(None)
-        erros_processamento.append(commit_hash)
-
-# 6. Adicione a nova coluna ao DataFrame combinado
-df_combined['levenshtein_distance'] = levenshtein_distances
+
+def calcular_metricas(linhas):
+    """
+    Gera um MetricResult com a distância de Levenshtein de cada ComparisonRow.
+    """
+    for row in linhas:
+        resultado = MetricResult(row)
+        try:
+            if not row.codigo_desenvolvedor.strip() or not row.codigo_llm.strip():
+                print(f"⚠️ Ignorando linha {row.index} do commit {row.commit_hash} devido a código vazio.")
+            elif not (PULAR_LLM_INVALIDO and not row.js_valid):
+                resultado.levenshtein_distance = Levenshtein.distance(row.codigo_desenvolvedor, row.codigo_llm)
+        except Exception as e:
+            print(f"❌ Erro inesperado no Levenshtein para o commit {row.commit_hash}: {e}")
+            erros_processamento.append(row.commit_hash)
+        yield resultado
+
+
+# 5. Itere sobre os registros (sem criar uma Series por linha)
+resultados = calcular_metricas(iter_comparison_rows(df_combined))
+
+# 6. Monte o DataFrame de resultados só na saída (mesmas colunas de antes)
+df_combined = metric_results_to_dataframe(
+    resultados,
+    ['commit_hash', 'codigo_llm', 'js_valid', 'codigo_desenvolvedor', 'levenshtein_distance'],
+)
 
 # 7. Salve o DataFrame final em um novo CSV
 try:
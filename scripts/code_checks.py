@@ -0,0 +1,117 @@
+"""
+Verificações rápidas sobre o código migrado: extração do bloco de código,
+validade sintática do JavaScript e sinais da migração Promise → async/await.
+"""
+import re
+
+from scripts.clean_csv import extrair_codigo_markdown_e_monitorar
+
+# Trechos do dataset costumam ser fragmentos (métodos de classe, propriedades
+# de objeto, corpos de função). Se não fizerem parse sozinhos, tentamos de
+# novo dentro destes envoltórios.
+FRAGMENT_WRAPPERS = [
+    ("class __Fragment__ {\n", "\n}"),
+    ("({\n", "\n})"),
+    ("(async function () {\n", "\n})"),
+]
+
+_parser = None
+
+
+def get_parser():
+    """
+    Parser tree-sitter de JavaScript (o mesmo que o CodeBLEU usa), criado na
+    primeira chamada. Retorna None se tree-sitter não estiver instalado.
+    Requer tree-sitter >= 0.22 (Language(ptr) e Parser(language)), a versão
+    fixada no requirements.txt e exigida pelo codebleu.
+    """
+    global _parser
+    if _parser is None:
+        try:
+            import tree_sitter_javascript
+            from tree_sitter import Language, Parser
+        except ImportError:
+            return None
+        _parser = Parser(Language(tree_sitter_javascript.language()))
+    return _parser
+
+
+def extract_code_block(texto):
+    """
+    Extrai o último bloco de código markdown da resposta, como o clean_csv.py.
+    Retorna (código, True) se havia um bloco ou (texto limpo, False) se não.
+    """
+    nao_capturados = []
+    codigo = extrair_codigo_markdown_e_monitorar(texto, nao_capturados)
+    return codigo, not nao_capturados
+
+
+def first_error(node):
+    """
+    Primeiro nó ERROR/MISSING da árvore (em pré-ordem), ou None.
+    """
+    if node.type == "ERROR" or node.is_missing:
+        return node
+    if not node.has_error:
+        return None
+    for child in node.children:
+        found = first_error(child)
+        if found is not None:
+            return found
+    return node
+
+
+def parse_javascript(code: str):
+    """
+    Faz o parse do código e retorna um dicionário com `valid` e a posição do
+    primeiro erro (`error_line`/`error_column`, base 1) quando inválido.
+    `valid` é None se não houver parser disponível.
+    """
+    parser = get_parser()
+    if parser is None:
+        return {"valid": None, "error_line": None, "error_column": None}
+
+    tree = parser.parse(code.encode("utf-8"))
+    if not tree.root_node.has_error:
+        return {"valid": True, "error_line": None, "error_column": None}
+
+    for prefix, suffix in FRAGMENT_WRAPPERS:
+        wrapped = parser.parse(f"{prefix}{code}{suffix}".encode("utf-8"))
+        if not wrapped.root_node.has_error:
+            return {"valid": True, "error_line": None, "error_column": None}
+
+    error = first_error(tree.root_node)
+    line, column = error.start_point
+    return {"valid": False, "error_line": line + 1, "error_column": column + 1}
+
+
+def migration_checks(code: str) -> dict:
+    """
+    Sinais simples de que a migração para async/await aconteceu.
+    """
+    return {
+        "has_async": bool(re.search(r"\basync\b", code)),
+        "has_await": bool(re.search(r"\bawait\b", code)),
+        "residual_then": bool(re.search(r"\.then\s*\(", code)),
+    }
+
+
+def gate_failure(texto) -> str | None:
+    """
+    Aplica os gates rápidos do modo cascata à resposta bruta da LLM.
+    Retorna o motivo da reprovação ou None se a resposta passou.
+    """
+    codigo, had_block = extract_code_block(texto)
+    if not had_block or not codigo:
+        return "sem bloco de código"
+
+    syntax = parse_javascript(codigo)
+    if syntax["valid"] is False:
+        return f"JavaScript inválido (linha {syntax['error_line']}, coluna {syntax['error_column']})"
+
+    checks = migration_checks(codigo)
+    if not checks["has_async"] or not checks["has_await"]:
+        return "sem async/await"
+    if checks["residual_then"]:
+        return "ainda contém .then("
+    return None
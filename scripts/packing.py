@@ -0,0 +1,105 @@
+"""
+Empacotamento de vários trechos pequenos em uma única requisição.
+
+Os trechos vão numerados entre delimitadores no lugar de {removed_chunk} e a
+resposta é separada de volta pelos mesmos delimitadores. Trechos cuja seção
+falta ou veio malformada na resposta são reprocessados individualmente por
+quem chamou.
+"""
+import re
+
+from scripts.code_checks import extract_code_block
+
+PACK_INSTRUCTIONS = (
+    "The code below contains {n} independent snippets, each one between "
+    "\"### SNIPPET <number> ###\" and \"### END SNIPPET <number> ###\". "
+    "Migrate each snippet separately. Answer with every migrated snippet between "
+    "the same markers, in the same order, each inside its own Markdown code block."
+)
+
+SECTION = re.compile(r"### SNIPPET (\d+) ###\s*\n(.*?)\n?\s*### END SNIPPET \1 ###", re.DOTALL)
+CODE_BLOCK = re.compile(r"```(?:\w*\s*)?\n?(.*?)```", re.DOTALL)
+
+
+def estimate_tokens(texto: str) -> int:
+    """
+    Estimativa grosseira (~4 caracteres por token), suficiente para montar os pacotes.
+    """
+    return len(texto) // 4 + 1
+
+
+def pack_rows(rows, max_tokens: int, max_snippet_tokens: int):
+    """
+    Agrupa MigrationRow pequenos consecutivos enquanto a soma estimada dos
+    trechos couber em `max_tokens`. Trechos com mais de `max_snippet_tokens`
+    (ou maiores que o próprio pacote) ficam sozinhos. A ordem das linhas é mantida.
+    """
+    group, used = [], 0
+    for row in rows:
+        tokens = estimate_tokens(row.removed_chunk)
+        if tokens > max_snippet_tokens or tokens > max_tokens:
+            if group:
+                yield group
+                group, used = [], 0
+            yield [row]
+            continue
+        if group and used + tokens > max_tokens:
+            yield group
+            group, used = [], 0
+        group.append(row)
+        used += tokens
+    if group:
+        yield group
+
+
+def build_packed_chunk(chunks: list[str]) -> str:
+    """
+    Texto que entra no lugar de {removed_chunk}: instruções + trechos numerados (base 1).
+    """
+    partes = [PACK_INSTRUCTIONS.format(n=len(chunks))]
+    for n, chunk in enumerate(chunks, 1):
+        partes.append(f"### SNIPPET {n} ###\n{chunk}\n### END SNIPPET {n} ###")
+    return "\n\n".join(partes)
+
+
+def split_packed_response(texto: str, n: int) -> dict[int, str]:
+    """
+    Separa a resposta por trecho. Retorna {número: código em bloco markdown}
+    só para as seções bem formadas: numeradas de 1 a n, sem repetição, com o
+    próprio bloco de código e não vazias. Seções sem bloco (texto solto) ficam
+    de fora, para serem reprocessadas sozinhas; a exceção é a resposta inteira
+    em um único bloco com todos os delimitadores dentro dele. O código volta
+    em um bloco ``` para o clean_csv.py continuar extraindo da mesma forma.
+    """
+    texto = re.sub(r"<think>.*?</think>", "", texto or "", flags=re.DOTALL)
+    blocos = CODE_BLOCK.findall(texto)
+    um_bloco = (
+        len(blocos) == 1
+        and 0 < len(SECTION.findall(blocos[0])) == len(SECTION.findall(texto))
+    )
+    if um_bloco:
+        texto = blocos[0]
+
+    secoes = {}
+    descartadas = set()
+    for match in SECTION.finditer(texto):
+        numero = int(match.group(1))
+        if not 1 <= numero <= n:
+            continue
+        if numero in secoes or numero in descartadas:
+            descartadas.add(numero)
+            continue
+        if um_bloco:
+            codigo = match.group(2).strip()
+        else:
+            codigo, had_block = extract_code_block(match.group(2))
+            if not had_block:
+                descartadas.add(numero)
+                continue
+        secoes[numero] = codigo
+
+    return {
+        numero: f"```javascript\n{codigo}\n```"
+        for numero, codigo in secoes.items()
+        if numero not in descartadas and codigo.strip()
+    }
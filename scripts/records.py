@@ -0,0 +1,183 @@
+"""
+Registros compactos (dataclasses com __slots__) que circulam entre as etapas
+do pipeline no lugar de linhas do pandas.
+
+As etapas são geradores que recebem e devolvem registros; DataFrames só são
+montados na entrada (leitura do CSV) e na saída (escrita do CSV).
+"""
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+
+def texto(valor) -> str:
+    """
+    Converte uma célula do CSV em str, tratando NaN como string vazia.
+    """
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    return str(valor)
+
+
+@dataclass(slots=True)
+class MigrationRow:
+    """
+    Uma linha do CSV de entrada do batch_migrate e, depois da chamada à LLM,
+    o código migrado e os metadados da chamada (status, tentativa, host...).
+    """
+    index: int
+    removed_chunk: str
+    commit_date: str = ""
+    commit_hash: str = ""
+    migrated_code: str | None = None
+    meta: dict = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ComparisonRow:
+    """
+    Uma linha pareada para as métricas: código original, do desenvolvedor e da LLM.
+    """
+    index: int
+    commit_hash: str
+    codigo_llm: str
+    codigo_desenvolvedor: str
+    codigo_original: str = ""
+    js_valid: bool = True
+
+
+@dataclass(slots=True)
+class CodeBLEUScores:
+    codebleu: float | None = None
+    ngram_match: float | None = None
+    weighted_ngram_match: float | None = None
+    syntax_match: float | None = None
+    dataflow_match: float | None = None
+
+    @classmethod
+    def from_result(cls, resultado: dict) -> "CodeBLEUScores":
+        """
+        Converte o dicionário retornado por calc_codebleu.
+        """
+        return cls(
+            codebleu=resultado["codebleu"],
+            ngram_match=resultado["ngram_match_score"],
+            weighted_ngram_match=resultado["weighted_ngram_match_score"],
+            syntax_match=resultado["syntax_match_score"],
+            dataflow_match=resultado["dataflow_match_score"],
+        )
+
+    @classmethod
+    def zero(cls) -> "CodeBLEUScores":
+        """
+        Scores zerados, para código que nem faz parse.
+        """
+        return cls(0.0, 0.0, 0.0, 0.0, 0.0)
+
+    def as_columns(self, sufixo: str) -> dict:
+        """
+        Colunas no formato do CSV de resultados (ex: codebleu_llm_vs_dev).
+        """
+        return {
+            f"codebleu_{sufixo}": self.codebleu,
+            f"ngram_match_{sufixo}": self.ngram_match,
+            f"weighted_ngram_match_{sufixo}": self.weighted_ngram_match,
+            f"syntax_match_{sufixo}": self.syntax_match,
+            f"dataflow_match_{sufixo}": self.dataflow_match,
+        }
+
+
+@dataclass(slots=True)
+class MetricResult:
+    """
+    Métricas calculadas para uma ComparisonRow. Comparações não calculadas
+    ficam com todos os campos None.
+    """
+    row: ComparisonRow
+    original_vs_dev: CodeBLEUScores = field(default_factory=CodeBLEUScores)
+    original_vs_llm: CodeBLEUScores = field(default_factory=CodeBLEUScores)
+    llm_vs_dev: CodeBLEUScores = field(default_factory=CodeBLEUScores)
+    levenshtein_distance: int | None = None
+
+
+# --- Entrada: DataFrame → registros ---
+
+def iter_migration_rows(df: pd.DataFrame) -> Iterator[MigrationRow]:
+    """
+    Gera um MigrationRow por linha do CSV de entrada (sem criar Series por linha).
+    commit_date e commit_hash são opcionais.
+    """
+    colunas = [c for c in ("removed_chunk", "commit_date", "commit_hash") if c in df.columns]
+    for index, valores in enumerate(df[colunas].itertuples(index=False, name=None)):
+        campos = dict(zip(colunas, map(texto, valores)))
+        yield MigrationRow(index=index, **campos)
+
+
+def iter_comparison_rows(df: pd.DataFrame) -> Iterator[ComparisonRow]:
+    """
+    Gera um ComparisonRow por linha do DataFrame combinado (LLM + desenvolvedor).
+    Colunas esperadas: commit_hash, codigo_llm, codigo_desenvolvedor e,
+    opcionalmente, codigo_original e js_valid.
+    `index` é o rótulo da linha no DataFrame: se ele não for refeito depois
+    do dropna, é a posição da linha nos CSVs de entrada (chave estável entre
+    configurações).
+    """
+    colunas = [
+        c for c in ("commit_hash", "codigo_llm", "codigo_desenvolvedor", "codigo_original", "js_valid")
+        if c in df.columns
+    ]
+    for index, valores in zip(df.index, df[colunas].itertuples(index=False, name=None)):
+        campos = dict(zip(colunas, valores))
+        js_valid = bool(campos.pop("js_valid", True))
+        yield ComparisonRow(
+            index=int(index),
+            js_valid=js_valid,
+            **{nome: texto(valor) for nome, valor in campos.items()},
+        )
+
+
+# --- Saída: registros → DataFrame ---
+
+def migration_rows_to_dataframe(rows: Iterable[MigrationRow]) -> pd.DataFrame:
+    """
+    DataFrame de saída do batch_migrate: colunas fixas seguidas dos metadados
+    (na ordem em que aparecem pela primeira vez).
+    """
+    registros = []
+    extras = []
+    for row in rows:
+        for chave in row.meta:
+            if chave not in extras:
+                extras.append(chave)
+        registros.append(row)
+
+    colunas = ["removed_chunk", "migrated_code", "commit_date", "commit_hash"] + extras
+    dados = [
+        [r.removed_chunk, r.migrated_code, r.commit_date, r.commit_hash]
+        + [r.meta.get(chave, "") for chave in extras]
+        for r in registros
+    ]
+    return pd.DataFrame(dados, columns=colunas)
+
+
+def metric_results_to_dataframe(resultados: Iterable[MetricResult], colunas: list[str]) -> pd.DataFrame:
+    """
+    DataFrame de resultados de métricas com as colunas pedidas, na ordem pedida.
+    """
+    linhas = []
+    for r in resultados:
+        linha = {
+            "identificador": r.row.index,
+            "commit_hash": r.row.commit_hash,
+            "codigo_original": r.row.codigo_original,
+            "codigo_desenvolvedor": r.row.codigo_desenvolvedor,
+            "codigo_llm": r.row.codigo_llm,
+            "js_valid": r.row.js_valid,
+            "levenshtein_distance": r.levenshtein_distance,
+        }
+        linha.update(r.original_vs_dev.as_columns("original_vs_dev"))
+        linha.update(r.original_vs_llm.as_columns("original_vs_llm"))
+        linha.update(r.llm_vs_dev.as_columns("llm_vs_dev"))
+        linhas.append([linha[c] for c in colunas])
+    return pd.DataFrame(linhas, columns=colunas)
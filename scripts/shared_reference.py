@@ -0,0 +1,196 @@
+"""
+Dataset de referência (todas_as_migracoes_unificadas.csv) em um bloco
+somente-leitura de offsets + bytes, compartilhado entre processos sem cópia.
+
+O processo principal cria o bloco uma vez (em shared memory ou num arquivo
+mapeado com mmap) e os workers de um ProcessPoolExecutor se conectam a ele
+pelo nome/caminho. Cada string é decodificada só quando é lida, então nada é
+serializado por tarefa.
+
+Layout do bloco:
+    MAGIC (8 bytes) | tamanho do cabeçalho (uint64) | cabeçalho JSON |
+    para cada coluna: offsets int64 (n + 1) | bytes UTF-8 concatenados
+"""
+import json
+import mmap
+import struct
+from multiprocessing import shared_memory
+
+import pandas as pd
+
+MAGIC = b"REFDS001"
+COLUNAS_PADRAO = ("commit_hash", "removed_chunk", "added_chunk")
+
+# Dataset do processo atual, definido pelo inicializador dos workers
+_dataset_worker = None
+
+
+def montar_bloco(df: pd.DataFrame, colunas=COLUNAS_PADRAO) -> bytes:
+    """
+    Serializa as colunas de texto do DataFrame no layout offsets + bytes.
+    """
+    partes = []
+    secoes = {}
+    posicao = 0
+    for coluna in colunas:
+        valores = [
+            b"" if pd.isna(v) else str(v).encode("utf-8")
+            for v in df[coluna].tolist()
+        ]
+        offsets = [0]
+        for valor in valores:
+            offsets.append(offsets[-1] + len(valor))
+        offsets_bytes = struct.pack(f"<{len(offsets)}q", *offsets)
+        dados = b"".join(valores)
+        secoes[coluna] = {
+            "offsets": posicao,
+            "dados": posicao + len(offsets_bytes),
+            "tamanho": len(dados),
+        }
+        # mantém os offsets da próxima coluna alinhados em 8 bytes
+        dados += b"\0" * ((-len(dados)) % 8)
+        partes += [offsets_bytes, dados]
+        posicao += len(offsets_bytes) + len(dados)
+
+    cabecalho = json.dumps({"n": len(df), "colunas": secoes}).encode("utf-8")
+    # as seções são relativas ao fim do cabeçalho; alinha em 8 bytes para os offsets
+    padding = (-(len(MAGIC) + 8 + len(cabecalho))) % 8
+    cabecalho += b" " * padding
+    return MAGIC + struct.pack("<Q", len(cabecalho)) + cabecalho + b"".join(partes)
+
+
+class SharedReferenceDataset:
+    """
+    Acesso somente-leitura ao bloco, por linha ou por commit_hash.
+    """
+    def __init__(self, buffer, owner=None):
+        self._owner = owner  # SharedMemory ou mmap que mantém o buffer vivo
+        self._buffer = memoryview(buffer)
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Bloco de referência inválido (MAGIC não confere)")
+        (tamanho,) = struct.unpack_from("<Q", self._buffer, len(MAGIC))
+        inicio = len(MAGIC) + 8
+        cabecalho = json.loads(bytes(self._buffer[inicio:inicio + tamanho]))
+        base = inicio + tamanho
+
+        self.n = cabecalho["n"]
+        self._colunas = {}
+        for coluna, secao in cabecalho["colunas"].items():
+            offsets = self._buffer[base + secao["offsets"]:base + secao["dados"]].cast("q")
+            dados = self._buffer[base + secao["dados"]:base + secao["dados"] + secao["tamanho"]]
+            self._colunas[coluna] = (offsets, dados)
+        self._indice_hash = None
+
+    # --- criação ---
+
+    @classmethod
+    def criar_shared_memory(cls, caminho_csv: str, colunas=COLUNAS_PADRAO, nome=None):
+        """
+        Lê o CSV e copia o bloco para um segmento de shared memory.
+        Quem cria é responsável por chamar `unlink()` no fim.
+        """
+        bloco = montar_bloco(pd.read_csv(caminho_csv), colunas)
+        shm = shared_memory.SharedMemory(name=nome, create=True, size=len(bloco))
+        shm.buf[:len(bloco)] = bloco
+        return cls(shm.buf, owner=shm)
+
+    @staticmethod
+    def escrever_arquivo(caminho_csv: str, caminho_bloco: str, colunas=COLUNAS_PADRAO) -> None:
+        """
+        Grava o bloco num arquivo, para ser aberto com mmap por `abrir_arquivo`.
+        """
+        with open(caminho_bloco, "wb") as f:
+            f.write(montar_bloco(pd.read_csv(caminho_csv), colunas))
+
+    # --- conexão ---
+
+    @classmethod
+    def conectar(cls, nome: str):
+        """
+        Conecta a um segmento de shared memory já criado (sem copiar).
+        """
+        try:
+            # Python 3.13+: o worker não registra o segmento no resource_tracker,
+            # que senão o removeria quando o worker terminasse
+            shm = shared_memory.SharedMemory(name=nome, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=nome)
+        return cls(shm.buf, owner=shm)
+
+    @classmethod
+    def abrir_arquivo(cls, caminho_bloco: str):
+        with open(caminho_bloco, "rb") as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapa, owner=mapa)
+
+    @property
+    def nome(self):
+        """
+        Nome do segmento de shared memory (para passar aos workers).
+        """
+        return getattr(self._owner, "name", None)
+
+    # --- leitura ---
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def colunas(self):
+        return list(self._colunas)
+
+    def get(self, linha: int, coluna: str) -> str:
+        offsets, dados = self._colunas[coluna]
+        if not 0 <= linha < self.n:
+            raise IndexError(linha)
+        return bytes(dados[offsets[linha]:offsets[linha + 1]]).decode("utf-8")
+
+    def coluna(self, coluna: str, inicio: int = 0, fim: int | None = None) -> list[str]:
+        fim = self.n if fim is None else min(fim, self.n)
+        return [self.get(i, coluna) for i in range(inicio, fim)]
+
+    def linha(self, linha: int) -> dict:
+        return {coluna: self.get(linha, coluna) for coluna in self._colunas}
+
+    def indices_de(self, commit_hash: str) -> list[int]:
+        """
+        Todas as linhas com esse commit_hash (um commit pode ter vários
+        trechos); lista vazia se não houver. O índice é montado na primeira chamada.
+        """
+        if self._indice_hash is None:
+            self._indice_hash = {}
+            for i, h in enumerate(self.coluna("commit_hash")):
+                self._indice_hash.setdefault(h, []).append(i)
+        return list(self._indice_hash.get(commit_hash, []))
+
+    # --- liberação ---
+
+    def close(self) -> None:
+        for offsets, dados in self._colunas.values():
+            offsets.release()
+            dados.release()
+        self._colunas = {}
+        self._buffer.release()
+        if self._owner is not None:
+            self._owner.close()
+
+    def unlink(self) -> None:
+        """
+        Remove o segmento de shared memory (só o processo que criou).
+        """
+        if isinstance(self._owner, shared_memory.SharedMemory):
+            self._owner.unlink()
+
+
+def inicializar_worker(nome: str) -> None:
+    """
+    `initializer` do ProcessPoolExecutor: conecta o worker ao dataset.
+    """
+    global _dataset_worker
+    _dataset_worker = SharedReferenceDataset.conectar(nome)
+
+
+def dataset_worker() -> SharedReferenceDataset:
+    if _dataset_worker is None:
+        raise RuntimeError("Worker sem dataset: use initializer=inicializar_worker")
+    return _dataset_worker
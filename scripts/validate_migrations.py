@@ -0,0 +1,106 @@
+import os
+import time
+from glob import glob
+
+import pandas as pd
+
+from scripts.code_checks import get_parser, migration_checks, parse_javascript
+
+CAMINHO_BASE = os.path.dirname(os.path.dirname(os.path.abspath(os.path.realpath(__file__))))
+PASTA_PROCESSADOS = os.path.join(CAMINHO_BASE, "output", "processed_files")
+
+# Colunas adicionadas aos CSVs limpos
+COLUNAS_VALIDACAO = [
+    "js_valid",
+    "js_error_line",
+    "js_error_column",
+    "has_async",
+    "has_await",
+    "residual_then",
+]
+
+
+def validar_codigo(codigo) -> dict:
+    """
+    Faz o parse do código migrado uma única vez e retorna as colunas de validação.
+    """
+    if pd.isna(codigo) or not str(codigo).strip():
+        return {
+            "js_valid": False,
+            "js_error_line": None,
+            "js_error_column": None,
+            "has_async": False,
+            "has_await": False,
+            "residual_then": False,
+        }
+    codigo = str(codigo)
+    sintaxe = parse_javascript(codigo)
+    return {
+        "js_valid": sintaxe["valid"],
+        "js_error_line": sintaxe["error_line"],
+        "js_error_column": sintaxe["error_column"],
+        **migration_checks(codigo),
+    }
+
+
+def verificar_validador() -> None:
+    """
+    Checagem de regressão: um trecho que não faz parse precisa sair como
+    inválido e com a linha do erro, senão as métricas não pulam nada.
+    """
+    resultado = validar_codigo("function (")
+    assert set(resultado) == set(COLUNAS_VALIDACAO), resultado
+    assert resultado["js_valid"] is False, resultado
+    assert resultado["js_error_line"] is not None, resultado
+
+
+def validar_arquivo(caminho: str) -> None:
+    """
+    Adiciona as colunas de validação ao CSV limpo (sobrescreve o arquivo).
+    """
+    df = pd.read_csv(caminho)
+    if "migrated_code" not in df.columns:
+        print(f"⚠️ Coluna 'migrated_code' não encontrada em {os.path.basename(caminho)}, pulando.")
+        return
+
+    inicio = time.perf_counter()
+    validacao = pd.DataFrame(
+        [validar_codigo(codigo) for codigo in df["migrated_code"]],
+        index=df.index,
+        columns=COLUNAS_VALIDACAO,
+    )
+    # revalidar substitui as colunas antigas
+    df = df.drop(columns=[c for c in COLUNAS_VALIDACAO if c in df.columns])
+    df = pd.concat([df, validacao], axis=1)
+    df.to_csv(caminho, index=False)
+
+    decorrido = time.perf_counter() - inicio
+    invalidos = int(validacao["js_valid"].eq(False).sum())
+    com_then = int(validacao["residual_then"].sum())
+    print(
+        f"✅ {os.path.basename(caminho)}: {len(df)} linhas em {decorrido:.2f}s "
+        f"({invalidos} inválidas, {com_then} ainda com .then())"
+    )
+
+
+def validar_pasta(pasta: str) -> None:
+    if get_parser() is None:
+        print("⚠️ tree-sitter não está instalado: a validade sintática ficará vazia.")
+        print("   Instale com: pip install tree-sitter tree-sitter-javascript")
+    else:
+        verificar_validador()
+
+    arquivos = sorted(glob(os.path.join(pasta, "*_limpo.csv")))
+    if not arquivos:
+        print(f"⚠️ Nenhum CSV limpo encontrado em {pasta}")
+        return
+    for caminho in arquivos:
+        try:
+            validar_arquivo(caminho)
+        except Exception as e:
+            print(f"❌ Erro ao validar {os.path.basename(caminho)}: {e}")
+
+
+# --- Execução do Script ---
+if __name__ == "__main__":
+    validar_pasta(PASTA_PROCESSADOS)
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Fila de trabalho com lease para dividir uma migração entre várias máquinas.
+
+O coordenador enfileira as linhas do CSV de entrada num arquivo SQLite; cada
+worker (em qualquer host com acesso ao arquivo) reserva um lote de linhas por
+um tempo limitado (lease), processa com os clientes de sempre e grava os
+resultados. Se um worker morrer, o lease expira e as linhas voltam para a fila
+(semântica at-least-once: uma linha pode ser processada mais de uma vez, mas
+só o primeiro resultado gravado vale).
+
+Uso:
+    python -m scripts.work_queue enqueue --db fila.sqlite -i input.csv -m ollama -v codellama -p one_shot
+    python -m scripts.work_queue work --db fila.sqlite --batch-size 8
+    python -m scripts.work_queue status --db fila.sqlite
+    python -m scripts.work_queue export --db fila.sqlite -o output/resultado.csv
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from models.registry import available_backends
+from models.replay import ResponseRecorder
+from scripts.batch_migrate import (
+    add_client_arguments,
+    apply_result,
+    build_ledger,
+    build_tiers,
+    prepare_tiers,
+    release_tiers,
+    report_ledger,
+    run_row,
+    write_output,
+)
+from scripts.records import MigrationRow, iter_migration_rows, texto
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    row_id        INTEGER PRIMARY KEY,
+    removed_chunk TEXT,
+    commit_date   TEXT,
+    commit_hash   TEXT,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    result        TEXT,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+"""
+
+
+def connect(db_path):
+    # sem WAL: o modo de journal padrão é o que funciona em sistemas de
+    # arquivos compartilhados (NFS) entre hosts
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 60000")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def read_meta(conn):
+    return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+
+def enqueue(args):
+    df = pd.read_csv(args.input_csv, encoding="utf-8", quoting=1, engine="python")
+    if "removed_chunk" not in df.columns:
+        raise SystemExit("⚠️ Coluna 'removed_chunk' não encontrada no CSV de entrada.")
+
+    conn = connect(args.db)
+    if conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]:
+        raise SystemExit(f"⚠️ A fila {args.db} já tem tarefas. Use outro arquivo.")
+
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany(
+        "INSERT INTO meta (key, value) VALUES (?, ?)",
+        [
+            ("input_csv", os.path.abspath(args.input_csv)),
+            ("model", args.model),
+            ("version", args.version),
+            ("prompt", args.prompt),
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO tasks (row_id, removed_chunk, commit_date, commit_hash) VALUES (?, ?, ?, ?)",
+        [
+            (row.index, row.removed_chunk, row.commit_date, row.commit_hash)
+            for row in iter_migration_rows(df)
+        ],
+    )
+    conn.execute("COMMIT")
+    print(f"✅ {len(df)} linhas enfileiradas em {args.db} ({args.model}/{args.version}/{args.prompt})")
+
+
+def claim(conn, owner, batch_size, lease_seconds):
+    """
+    Reserva até `batch_size` linhas pendentes ou com lease expirado.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            """
+            SELECT row_id, removed_chunk, commit_date FROM tasks
+            WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+            ORDER BY row_id
+            LIMIT ?
+            """,
+            (now, batch_size),
+        ).fetchall()
+        conn.executemany(
+            """
+            UPDATE tasks
+            SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+            WHERE row_id = ?
+            """,
+            [(owner, now + lease_seconds, row_id) for row_id, _, _ in rows],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+
+def complete(conn, row_id, result, tokens=0, cost=0.0):
+    """
+    Grava o resultado e soma o gasto (tokens/custo ainda não gravados por
+    este worker) ao total do run, na mesma transação.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # at-least-once: o primeiro resultado gravado vence, mesmo que o lease
+        # deste worker já tenha expirado e outro worker tenha pego a linha
+        conn.execute(
+            """
+            UPDATE tasks
+            SET status = 'done', result = ?, finished_at = ?, lease_owner = NULL, lease_expires = NULL
+            WHERE row_id = ? AND status != 'done'
+            """,
+            (json.dumps(result, ensure_ascii=False), time.time(), row_id),
+        )
+        add_spend(conn, tokens, cost)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def add_spend(conn, tokens, cost):
+    """
+    Soma tokens/custo ao gasto do run guardado em `meta` (spent_tokens, spent_cost).
+    """
+    conn.executemany(
+        """
+        INSERT INTO meta (key, value) VALUES (?, ?)
+        ON CONFLICT (key) DO UPDATE SET value = CAST(meta.value AS REAL) + CAST(excluded.value AS REAL)
+        """,
+        [("spent_tokens", tokens), ("spent_cost", cost)],
+    )
+
+
+def read_spend(conn):
+    """
+    Gasto do run somado entre todos os workers: (tokens, custo).
+    """
+    meta = read_meta(conn)
+    return int(float(meta.get("spent_tokens", 0))), float(meta.get("spent_cost", 0.0))
+
+
+class SpendTracker:
+    """
+    Liga o TokenLedger deste worker ao gasto do run guardado na fila: separa
+    o que ainda não foi gravado e atualiza o gasto dos outros workers.
+    """
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.flushed_tokens = 0
+        self.flushed_cost = 0.0
+
+    def pending(self):
+        """
+        Gasto deste worker ainda não gravado, já marcado como gravado.
+        """
+        tokens, cost = self.ledger.total_tokens, self.ledger.total_cost
+        delta = (tokens - self.flushed_tokens, cost - self.flushed_cost)
+        self.flushed_tokens, self.flushed_cost = tokens, cost
+        return delta
+
+    def sync(self, conn):
+        spent_tokens, spent_cost = read_spend(conn)
+        self.ledger.external_tokens = spent_tokens - self.flushed_tokens
+        self.ledger.external_cost = spent_cost - self.flushed_cost
+
+
+def renew(conn, owner, lease_seconds):
+    """
+    Estende o lease das linhas ainda reservadas por este worker (heartbeat).
+    """
+    conn.execute(
+        "UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = 'leased'",
+        (time.time() + lease_seconds, owner),
+    )
+
+
+def release_lease(conn, row_id, owner):
+    """
+    Devolve à fila uma linha reservada por este worker que não foi processada.
+    """
+    conn.execute(
+        """
+        UPDATE tasks
+        SET status = 'pending', lease_owner = NULL, lease_expires = NULL
+        WHERE row_id = ? AND lease_owner = ? AND status = 'leased'
+        """,
+        (row_id, owner),
+    )
+
+
+def heartbeat(db_path, owner, lease_seconds, stop):
+    """
+    Renova os leases deste worker a cada terço do lease até `stop` ser
+    sinalizado, para que uma linha lenta (cascata com vários tiers, prazos
+    longos) não expire enquanto ainda está sendo processada.
+    Roda em uma thread própria, com a sua conexão sqlite.
+    """
+    conn = connect(db_path)
+    try:
+        while not stop.wait(lease_seconds / 3):
+            try:
+                renew(conn, owner, lease_seconds)
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Falha ao renovar o lease: {e}")
+    finally:
+        conn.close()
+
+
+def work(args):
+    conn = connect(args.db)
+    meta = read_meta(conn)
+    if not meta:
+        raise SystemExit(f"⚠️ Fila {args.db} vazia: rode 'enqueue' antes.")
+    args.model, args.version, args.prompt = meta["model"], meta["version"], meta["prompt"]
+
+    worker_id = uuid.uuid4().hex[:8]
+    owner = f"{socket.gethostname()}:{os.getpid()}:{worker_id}"
+    tiers = build_tiers(args)
+    # o orçamento vale para o run inteiro: o gasto de todos os workers fica na fila
+    ledger = build_ledger(args, tiers)
+    spend = SpendTracker(ledger)
+    recorder = ResponseRecorder(args.record) if args.record else None
+    template = tiers[0][0].load_template(args.prompt)
+    prepare_tiers(tiers, template, args)
+    print(f"🔄 Worker {owner} processando {args.model}/{args.version}/{args.prompt}")
+
+    stop = threading.Event()
+    threading.Thread(
+        target=heartbeat, args=(args.db, owner, args.lease_seconds, stop), daemon=True
+    ).start()
+
+    processed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            while True:
+                spend.sync(conn)
+                if ledger.exceeded:
+                    print("⚠️ Orçamento do run atingido: o worker não reserva mais linhas.")
+                    break
+                batch = claim(conn, owner, args.batch_size, args.lease_seconds)
+                if not batch:
+                    break
+
+                def run(task):
+                    row_id, chunk, date = task
+                    result = run_row(tiers, template, chunk, date, args, ledger, recorder)
+                    return row_id, result
+
+                # os resultados são gravados pela thread principal: a conexão
+                # sqlite não é compartilhada entre threads
+                for row_id, result in executor.map(run, batch):
+                    if result["status"] == "BUDGET":
+                        # não enviada: volta para a fila na hora
+                        release_lease(conn, row_id, owner)
+                        continue
+                    complete(conn, row_id, result, *spend.pending())
+                    processed += 1
+                    print(f"[{row_id}] → {result['status'].lower()}")
+    finally:
+        stop.set()
+        release_tiers(tiers, args)
+        if recorder is not None:
+            recorder.close()
+        # gasto de chamadas que terminaram depois do último resultado gravado
+        tokens, cost = spend.pending()
+        conn.execute("BEGIN IMMEDIATE")
+        add_spend(conn, tokens, cost)
+        conn.execute("COMMIT")
+    print(f"✅ Worker {owner} terminou: {processed} linhas processadas.")
+    report_ledger(ledger, f"{os.path.splitext(args.db)[0]}.{worker_id}.ledger.json")
+
+
+def status(args):
+    conn = connect(args.db)
+    counts = dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+    expired = conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE status = 'leased' AND lease_expires < ?",
+        (time.time(),),
+    ).fetchone()[0]
+    meta = read_meta(conn)
+    print(f"📦 {meta.get('model')}/{meta.get('version')}/{meta.get('prompt')} ({meta.get('input_csv')})")
+    for name in ("pending", "leased", "done"):
+        print(f"   • {name}: {counts.get(name, 0)}")
+    if expired:
+        print(f"   ⚠️ {expired} leases expirados (serão reprocessados)")
+    spent_tokens, spent_cost = read_spend(conn)
+    print(f"   💰 gasto do run: {spent_tokens} tokens, US$ {spent_cost:.4f}")
+
+
+def export(args):
+    conn = connect(args.db)
+    rows = conn.execute(
+        "SELECT removed_chunk, commit_date, commit_hash, status, result FROM tasks ORDER BY row_id"
+    ).fetchall()
+    pending = sum(1 for row in rows if row[3] != "done")
+    if pending and not args.partial:
+        raise SystemExit(f"⚠️ Ainda há {pending} linhas não concluídas. Use --partial para exportar mesmo assim.")
+
+    records = (
+        apply_result(
+            MigrationRow(index, texto(chunk), texto(date), texto(commit_hash)),
+            json.loads(result) if result else {"migrated_code": ""},
+        )
+        for index, (chunk, date, commit_hash, _, result) in enumerate(rows)
+    )
+    write_output(records, args.output_csv)
+    print(f"✅ {len(rows) - pending} resultados exportados para {args.output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fila de trabalho distribuída para a migração em lote"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="enfileira as linhas do CSV de entrada")
+    p_enqueue.add_argument("--db", required=True, help="arquivo SQLite da fila")
+    p_enqueue.add_argument("--input-csv", "-i", required=True, help="CSV de entrada (coluna removed_chunk)")
+    p_enqueue.add_argument("--model", "-m", choices=available_backends(), required=True, help="qual backend usar")
+    p_enqueue.add_argument("--version", "-v", required=True, help="versão do modelo (ex: gpt-4, llama2)")
+    p_enqueue.add_argument(
+        "--prompt", "-p",
+        required=True,
+        choices=["one_shot", "zero_shot", "chain_of_thoughts"],
+        help="qual template usar",
+    )
+    p_enqueue.set_defaults(func=enqueue)
+
+    p_work = sub.add_parser("work", help="processa lotes da fila até ela esvaziar")
+    p_work.add_argument("--db", required=True, help="arquivo SQLite da fila")
+    p_work.add_argument("--batch-size", type=int, default=8, help="linhas reservadas por vez")
+    p_work.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=900,
+        help="tempo até um lote reservado voltar para a fila se o worker parar de "
+             "renovar o lease (renovado a cada terço desse tempo; padrão: 900)",
+    )
+    add_client_arguments(p_work)
+    p_work.set_defaults(func=work)
+
+    p_status = sub.add_parser("status", help="mostra o andamento da fila")
+    p_status.add_argument("--db", required=True, help="arquivo SQLite da fila")
+    p_status.set_defaults(func=status)
+
+    p_export = sub.add_parser("export", help="gera o CSV de saída a partir da fila")
+    p_export.add_argument("--db", required=True, help="arquivo SQLite da fila")
+    p_export.add_argument("--output-csv", "-o", default="out.csv", help="caminho para CSV de saída")
+    p_export.add_argument("--partial", action="store_true", help="exporta mesmo com linhas pendentes")
+    p_export.set_defaults(func=export)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()